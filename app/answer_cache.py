@@ -0,0 +1,140 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from upload_store import stored_content_hash
+
+SQL_CACHE_MAX_ENTRIES = int(os.getenv("SQL_CACHE_MAX_ENTRIES", "1024"))
+SQL_CACHE_TTL_SECONDS = float(os.getenv("SQL_CACHE_TTL_SECONDS", "86400"))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "256"))
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "3600"))
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class LRUCache:
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None and self.ttl_seconds and time.monotonic() - item[0] > self.ttl_seconds:
+                del self._entries[key]
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, predicate=None):
+        with self._lock:
+            if predicate is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                return removed
+            stale = [key for key, (_, value) in self._entries.items() if predicate(key, value)]
+            for key in stale:
+                del self._entries[key]
+            return len(stale)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0
+            }
+
+
+sql_cache = LRUCache(SQL_CACHE_MAX_ENTRIES, SQL_CACHE_TTL_SECONDS)
+result_cache = LRUCache(RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_TTL_SECONDS)
+
+_hash_lock = threading.Lock()
+_hash_memo = {}
+
+
+def normalize_question(question):
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip("?.! ")
+
+
+def db_content_hash(db_path):
+    # Content-addressed uploads carry their hash in the name they link to;
+    # anything else is hashed, memoized on (size, mtime).
+    content_hash = stored_content_hash(db_path)
+    if content_hash:
+        return content_hash
+    stat = os.stat(db_path)
+    signature = (stat.st_size, stat.st_mtime_ns)
+    key = os.path.abspath(db_path)
+    with _hash_lock:
+        memo = _hash_memo.get(key)
+        if memo and memo[0] == signature:
+            return memo[1]
+
+    digest = hashlib.sha256()
+    with open(db_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    content_hash = digest.hexdigest()
+
+    with _hash_lock:
+        _hash_memo[key] = (signature, content_hash)
+    return content_hash
+
+
+def get_cached_sql(question, db_id, schema_version):
+    return sql_cache.get((normalize_question(question), db_id, schema_version))
+
+
+def put_cached_sql(question, db_id, schema_version, value):
+    sql_cache.put((normalize_question(question), db_id, schema_version), value)
+
+
+def get_cached_result(db_hash, sql):
+    return result_cache.get((db_hash, sql.strip()))
+
+
+def put_cached_result(db_hash, sql, result):
+    # Results are shared by every session, so only the first page, the total
+    # row count and the governed SQL are kept, never the session's spill file;
+    # on a hit later pages are queried again from the database.
+    result_cache.put((db_hash, sql.strip()), {**result, "spill": None})
+
+
+def invalidate_db(db_id, db_path=None):
+    # Called when a database file or its metadata is re-uploaded.
+    removed = sql_cache.invalidate(lambda key, value: key[1] == db_id or value.get("db_id") == db_id)
+    if db_path:
+        with _hash_lock:
+            memo = _hash_memo.pop(os.path.abspath(db_path), None)
+        old_hash = stored_content_hash(db_path) or (memo[1] if memo else None)
+        if old_hash:
+            removed += result_cache.invalidate(lambda key, value: key[0] == old_hash)
+    return removed
+
+
+def cache_stats():
+    return {"question_to_sql": sql_cache.stats(), "sql_to_result": result_cache.stats()}
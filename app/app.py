@@ -1,13 +1,57 @@
+import time
+_script_start = time.perf_counter()
+
 import streamlit as st
 from upload_ui import upload_schema_page
 from query_ui import query_interface_page
 from dotenv import load_dotenv
 import os
+import threading
+
+import embeddings
+from telemetry import configure_logging, log_event, start_metrics_server
+from result_spill import clear_session
+from utils import init_metadata_db
 
 st.set_page_config(page_title="NL2SQL Assistant", layout="wide")
 
 load_dotenv()
+configure_logging()
 model_server_url = os.getenv("MODEL_SERVER_URL")
+_import_seconds = time.perf_counter() - _script_start
+
+
+@st.cache_resource
+def _start_model_warm_up():
+    # Runs once per process; loads the embedding model off the request path.
+    thread = threading.Thread(target=embeddings.warm_up, daemon=True)
+    thread.start()
+    return thread
+
+
+if os.getenv("WARMUP_MODELS", "0") == "1":
+    _start_model_warm_up()
+
+
+@st.cache_resource
+def _init_metadata_store():
+    # Runs once per process: migrations, the encoder check and the embedding
+    # backfill scan the whole store, so they stay off every rerun.
+    init_metadata_db()
+    return True
+
+
+_init_metadata_store()
+
+
+@st.cache_resource
+def _start_metrics_endpoint(port):
+    # Prometheus text at /metrics and JSON at /metrics.json on a side port.
+    return start_metrics_server(port)
+
+
+if os.getenv("METRICS_PORT"):
+    _start_metrics_endpoint(int(os.getenv("METRICS_PORT")))
 
 
 if "active_page" not in st.session_state:
@@ -22,6 +66,7 @@ if st.sidebar.button("📤 Upload Schema"):
 if st.sidebar.button("🔎 Query Interface"):
     st.session_state.active_page = "query"
 if st.sidebar.button("🧹 Start New Session"):
+    clear_session(st.session_state.get("session_id"))
     st.session_state.clear()
     st.session_state.active_page = "home"
 
@@ -42,3 +87,13 @@ elif st.session_state.active_page == "upload":
 
 elif st.session_state.active_page == "query":
     query_interface_page(model_server_url)
+
+_render_seconds = time.perf_counter() - _script_start
+log_event("page_render", page=st.session_state.active_page,
+          imports_ms=round(_import_seconds * 1000, 1), render_ms=round(_render_seconds * 1000, 1))
+with st.sidebar.expander("⏱️ Startup timing"):
+    st.write({
+        "imports_ms": round(_import_seconds * 1000, 1),
+        "page_render_ms": round(_render_seconds * 1000, 1),
+        **{k.replace("_seconds", "_ms"): round(v * 1000, 1) for k, v in embeddings.load_timings.items()},
+    })
@@ -0,0 +1,178 @@
+import os
+import re
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+from embeddings import encode
+from utils import build_semantic_info_dict
+from metadata_store import get_schema_version
+from prompt_builder import build_prompt, PROMPT_TOKEN_BUDGET
+from intent_infer import get_api_session, API_TIMEOUT, API_MAX_WORKERS
+from sql_executor import execute_query
+from upload_store import UPLOAD_DIR
+from telemetry import span, increment
+
+DB_PATH_TEMPLATE = os.path.join(UPLOAD_DIR, "{db_id}")
+SQL_WORKERS = os.cpu_count() or 1
+# Scoring needs complete results, so evaluation runs without the row limit and
+# with its own (longer) time budget; 0 disables the budget.
+EVAL_TIME_BUDGET_SECONDS = float(os.getenv("EVAL_SQL_TIME_BUDGET_SECONDS", "60"))
+
+_ORDER_BY_RE = re.compile(r"\border\s+by\b", re.I)
+
+
+def normalize_sql(sql):
+    # Case, whitespace, quote style and a trailing semicolon don't count
+    # against exact match.
+    sql = sql.strip().rstrip(";").replace('"', "'")
+    sql = re.sub(r"\s*([(),=<>])\s*", r"\1", sql)
+    return re.sub(r"\s+", " ", sql).lower().strip()
+
+
+def results_match(predicted_rows, gold_rows, ordered):
+    # Row order only matters when the gold query asks for one.
+    if ordered:
+        return predicted_rows == gold_rows
+    return Counter(predicted_rows) == Counter(gold_rows)
+
+
+def _execute(db_path, sql, time_budget=EVAL_TIME_BUDGET_SECONDS):
+    start = time.perf_counter()
+    try:
+        with execute_query(db_path, sql, max_rows=0, time_budget=time_budget) as result:
+            return [tuple(row) for row in result.fetchall()], None, time.perf_counter() - start
+    except Exception as e:
+        return None, str(e), time.perf_counter() - start
+
+
+def evaluate_execution(db_path, predicted_sql, gold_sql=None, time_budget=EVAL_TIME_BUDGET_SECONDS):
+    # Runs in a worker process; only the verdict travels back, not the rows.
+    predicted_rows, predicted_error, seconds = _execute(db_path, predicted_sql, time_budget)
+    outcome = {"pred_error": predicted_error, "exec_seconds": seconds}
+    if gold_sql:
+        gold_rows, gold_error, _ = _execute(db_path, gold_sql, time_budget)
+        outcome["gold_error"] = gold_error
+        outcome["execution_match"] = (
+            predicted_error is None and gold_error is None
+            and results_match(predicted_rows, gold_rows, bool(_ORDER_BY_RE.search(gold_sql)))
+        )
+    return outcome
+
+
+def generate_sql(api_url, prompt, timeout=API_TIMEOUT):
+    with span("model_server_call", endpoint="generate_query"):
+        response = get_api_session().post(f"{api_url}/generate_query", json={"prompt": prompt}, timeout=timeout)
+    increment("model_server_responses_total", endpoint="generate_query", status=response.status_code)
+    if response.status_code != 200:
+        raise Exception(f"API Error {response.status_code}: {response.text}")
+    return response.json()["sql_query"]
+
+
+def latency_summary(samples):
+    if not samples:
+        return {"n": 0}
+    values = np.asarray(samples) * 1000
+    return {
+        "n": len(samples),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99))
+    }
+
+
+def _build_prompt(example, question_embedding, top_k, metadata_db):
+    start = time.perf_counter()
+    db_id, db_schema = build_semantic_info_dict(
+        example["question"], top_k, metadata_db, question_embedding=question_embedding, db_id=example["db_id"]
+    )
+    if not db_schema:
+        raise LookupError(f"No indexed tables for {example['db_id']}")
+    prompt = build_prompt(example["question"], db_id, db_schema, schema_version=get_schema_version(db_id, metadata_db),
+                          token_budget=PROMPT_TOKEN_BUDGET)
+    return prompt, time.perf_counter() - start
+
+
+def run_batch(examples, model_server_url, metadata_db="metadata_store.db", db_path_template=DB_PATH_TEMPLATE,
+              top_k=4, concurrency=API_MAX_WORKERS, sql_workers=SQL_WORKERS, time_budget=EVAL_TIME_BUDGET_SECONDS):
+    # examples: dicts with db_id, question and optionally gold SQL under
+    # "gold_sql" or Spider's "query". Returns (per-example results, report).
+    wall_start = time.perf_counter()
+    results = [
+        {"db_id": ex["db_id"], "question": ex["question"], "gold_sql": ex.get("gold_sql") or ex.get("query")}
+        for ex in examples
+    ]
+    stage_samples = {"prompt_build": [], "generation": [], "execution": []}
+
+    # All questions go through the encoder as one batch.
+    start = time.perf_counter()
+    with span("embedding", kind="question", texts=len(examples)):
+        question_embeddings = encode([ex["question"] for ex in examples]) if examples else []
+    embedding_seconds = time.perf_counter() - start
+
+    prompts = [None] * len(examples)
+    for i, example in enumerate(examples):
+        try:
+            prompts[i], seconds = _build_prompt(example, question_embeddings[i], top_k, metadata_db)
+            stage_samples["prompt_build"].append(seconds)
+        except Exception as e:
+            results[i]["error"] = str(e)
+
+    def timed_generation(prompt):
+        start = time.perf_counter()
+        sql = generate_sql(model_server_url, prompt)
+        return sql, time.perf_counter() - start
+
+    # Generation requests run concurrently so the model server can batch them;
+    # each answer goes to the SQL process pool as soon as it arrives.
+    with ThreadPoolExecutor(max_workers=concurrency) as threads, ProcessPoolExecutor(max_workers=sql_workers) as processes:
+        generations = {threads.submit(timed_generation, prompt): i for i, prompt in enumerate(prompts) if prompt}
+        executions = {}
+        for future in as_completed(generations):
+            i = generations[future]
+            try:
+                results[i]["predicted_sql"], seconds = future.result()
+            except Exception as e:
+                results[i]["error"] = str(e)
+                continue
+            stage_samples["generation"].append(seconds)
+            db_path = db_path_template.format(db_id=results[i]["db_id"])
+            executions[processes.submit(evaluate_execution, db_path, results[i]["predicted_sql"],
+                                        results[i]["gold_sql"], time_budget)] = i
+        for future in as_completed(executions):
+            i = executions[future]
+            outcome = future.result()
+            stage_samples["execution"].append(outcome.pop("exec_seconds"))
+            results[i].update(outcome)
+
+    wall_seconds = time.perf_counter() - wall_start
+    return results, summarize(results, stage_samples, embedding_seconds, wall_seconds)
+
+
+def summarize(results, stage_samples, embedding_seconds, wall_seconds):
+    with_gold = [r for r in results if r["gold_sql"]]
+    answered = [r for r in results if r.get("predicted_sql")]
+    report = {
+        "questions": len(results),
+        "answered": len(answered),
+        "pipeline_errors": sum(1 for r in results if r.get("error")),
+        "sql_errors": sum(1 for r in answered if r.get("pred_error")),
+        "wall_seconds": wall_seconds,
+        "questions_per_second": len(results) / wall_seconds if wall_seconds else 0.0,
+        "stages": {
+            "embedding_batch_ms": embedding_seconds * 1000,
+            "embedding_per_question_ms": embedding_seconds * 1000 / len(results) if results else 0.0,
+            **{stage: latency_summary(samples) for stage, samples in stage_samples.items()}
+        }
+    }
+    if with_gold:
+        report["execution_accuracy"] = sum(1 for r in with_gold if r.get("execution_match")) / len(with_gold)
+        report["exact_match"] = sum(
+            1 for r in with_gold
+            if r.get("predicted_sql") and normalize_sql(r["predicted_sql"]) == normalize_sql(r["gold_sql"])
+        ) / len(with_gold)
+        report["gold_errors"] = sum(1 for r in with_gold if r.get("gold_error"))
+    return report
@@ -1,45 +1,320 @@
-import sqlparse
+import io
+import re
+
+CHUNK_SIZE = 64 * 1024
+
+_SPECIAL_RE = re.compile(r"['\"`\[;]|--|/\*")
+_CLOSERS = {"'": "'", '"': '"', "`": "`", "[": "]", "--": "\n", "/*": "*/"}
+
+_TOKEN_RE = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<comment>--[^\n]*|/\*.*?(?:\*/|$))
+  | (?P<quoted>"(?:[^"]|"")*"|`(?:[^`]|``)*`|\[[^\]]*\])
+  | (?P<string>'(?:[^'\\]|\\.|'')*')
+  | (?P<word>[A-Za-z_][\w$]*|\d+(?:\.\d+)?)
+  | (?P<punct>.)
+""", re.X | re.S)
+
+_COLUMN_CONSTRAINTS = {
+    "CONSTRAINT", "NOT", "NULL", "PRIMARY", "UNIQUE", "CHECK", "DEFAULT", "REFERENCES", "COLLATE",
+    "AUTO_INCREMENT", "AUTOINCREMENT", "GENERATED", "COMMENT", "AS", "IDENTITY", "ON", "CHARACTER",
+}
+_TABLE_CONSTRAINTS = {"CONSTRAINT", "PRIMARY", "FOREIGN", "UNIQUE", "CHECK", "EXCLUDE"}
+_INDEX_KEYWORDS = {"KEY", "INDEX", "FULLTEXT", "SPATIAL"}
+_TYPE_WORDS = {
+    "INT", "INTEGER", "BIGINT", "SMALLINT", "TINYINT", "MEDIUMINT", "DECIMAL", "NUMERIC", "NUMBER",
+    "FLOAT", "DOUBLE", "REAL", "CHAR", "VARCHAR", "NVARCHAR", "NCHAR", "TEXT", "BLOB", "BIT",
+    "BINARY", "VARBINARY", "DATE", "DATETIME", "TIME", "TIMESTAMP", "BOOLEAN", "BOOL", "ENUM", "SET",
+}
+
+
+def _iter_chunks(source, chunk_size):
+    if isinstance(source, str):
+        source = io.StringIO(source)
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk.decode("utf-8") if isinstance(chunk, bytes) else chunk
 
-def extract_schema_metadata(ddl_sql):
-    statements = sqlparse.parse(ddl_sql)
-    metadata = []
 
-    for stmt in statements:
-        if stmt.get_type() != 'CREATE':
+def _find_close(buf, start, token):
+    # Index just past the construct opened by token, or -1 if it is not closed yet.
+    closer = _CLOSERS[token]
+    i = start
+    while True:
+        j = buf.find(closer, i)
+        if j < 0:
+            return -1
+        if token == "'":
+            backslashes = 0
+            while j - backslashes - 1 >= start and buf[j - backslashes - 1] == "\\":
+                backslashes += 1
+            if backslashes % 2:
+                i = j + 1
+                continue
+        if token in ("'", '"', "`") and buf.startswith(closer, j + 1):
+            i = j + 2
             continue
+        return j + len(closer)
+
+
+def iter_statements(source, chunk_size=CHUNK_SIZE):
+    # Splits a DDL string or text stream on top-level semicolons, skipping over
+    # quoted text and comments. Only the current statement (plus at most one
+    # unread chunk) is held in memory.
+    chunks = _iter_chunks(source, chunk_size)
+    buf, start, pos, eof = "", 0, 0, False
 
-        tokens = stmt.tokens
-        table_name = None
-        column_definitions = []
-        for token in tokens:
-            if isinstance(token, sqlparse.sql.Identifier) and not table_name:
-                table_name = token.get_name()
-            elif isinstance(token, sqlparse.sql.Parenthesis):
-                column_definitions = token.value.strip('()').split(',')
+    def read_more():
+        nonlocal buf, start, pos, eof
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+            return 0
+        # Drop the statements already yielded before growing the buffer.
+        buf = buf[start:] + chunk
+        shift, start = start, 0
+        pos -= shift
+        return shift
 
-        if not table_name or not column_definitions:
+    while True:
+        match = _SPECIAL_RE.search(buf, pos)
+        if match is None:
+            if eof:
+                break
+            # A trailing '-' or '/' might open a comment continued in the next chunk.
+            pos = len(buf) - 1 if len(buf) > pos and buf[-1] in "-/" else len(buf)
+            read_more()
             continue
 
-        column_names = []
-        data_types = []
+        token = match.group()
+        if token == ";":
+            statement = buf[start:match.start()]
+            start = pos = match.end()
+            if statement.strip():
+                yield statement
+            continue
 
-        for col in column_definitions:
-            col = col.strip()
-            if not col:
-                continue
-            if col.upper().startswith('FOREIGN KEY'):
-                continue
-            parts = col.split()
-            if len(parts) < 2:
-                continue
+        body_start = match.end()
+        while True:
+            end = _find_close(buf, body_start, token)
+            # A closer at the very end of the buffer may still be an escaped ('') quote.
+            if 0 <= end < len(buf) or eof:
+                break
+            body_start -= read_more()
+        pos = end if end >= 0 else len(buf)
+
+    if buf[start:].strip():
+        yield buf[start:]
+
+
+def _tokenize(statement):
+    tokens = []
+    for match in _TOKEN_RE.finditer(statement):
+        kind = match.lastgroup
+        value = match.group()
+        if kind in ("space", "comment"):
+            continue
+        if kind == "quoted":
+            quote = value[0]
+            value = value[1:-1]
+            if quote != "[":
+                value = value.replace(quote * 2, quote)
+            kind = "ident"
+        tokens.append((kind, value))
+    return tokens
+
+
+def _upper(token):
+    return token[1].upper() if token[0] == "word" else None
+
+
+def _is_name(token):
+    return token[0] in ("word", "ident")
+
+
+def _split_top_level(tokens):
+    # Splits a token list on commas that are not inside parentheses.
+    groups, current, depth = [], [], 0
+    for token in tokens:
+        if token == ("punct", "("):
+            depth += 1
+        elif token == ("punct", ")"):
+            depth -= 1
+        elif token == ("punct", ",") and depth == 0:
+            groups.append(current)
+            current = []
+            continue
+        current.append(token)
+    if current:
+        groups.append(current)
+    return groups
 
-            column_name = parts[0]
-            data_type = parts[1]
 
-            column_names.append(column_name)
-            data_types.append(data_type)
+def _paren_group(tokens, start):
+    # tokens[start] is "("; returns (inner tokens, index after the matching ")").
+    depth = 0
+    for i in range(start, len(tokens)):
+        if tokens[i] == ("punct", "("):
+            depth += 1
+        elif tokens[i] == ("punct", ")"):
+            depth -= 1
+            if depth == 0:
+                return tokens[start + 1:i], i + 1
+    return tokens[start + 1:], len(tokens)
 
-        metadata.append([table_name, column_names, data_types])
 
-    return metadata
+def _name_list(tokens):
+    # "(a, b DESC, c(10))" -> ["a", "b", "c"]
+    return [group[0][1] for group in _split_top_level(tokens) if group and _is_name(group[0])]
 
+
+def _qualified_name(tokens, i):
+    # Returns (last name part, index after the name) for names like schema.table.
+    name = tokens[i][1]
+    i += 1
+    while i + 1 < len(tokens) and tokens[i] == ("punct", ".") and _is_name(tokens[i + 1]):
+        name = tokens[i + 1][1]
+        i += 2
+    return name, i
+
+
+def _parse_references(tokens, i):
+    ref_table, i = _qualified_name(tokens, i)
+    ref_columns = []
+    if i < len(tokens) and tokens[i] == ("punct", "("):
+        inner, i = _paren_group(tokens, i)
+        ref_columns = _name_list(inner)
+    return ref_table, ref_columns, i
+
+
+def _parse_table_constraint(item, table):
+    i = 0
+    if _upper(item[0]) == "CONSTRAINT":
+        i = 2
+    keyword = _upper(item[i]) if i < len(item) else None
+    if keyword == "PRIMARY":
+        start = next((j for j in range(i, len(item)) if item[j] == ("punct", "(")), None)
+        if start is not None:
+            table["primary_keys"].extend(_name_list(_paren_group(item, start)[0]))
+    elif keyword == "FOREIGN":
+        start = next((j for j in range(i, len(item)) if item[j] == ("punct", "(")), None)
+        if start is None:
+            return
+        inner, j = _paren_group(item, start)
+        columns = _name_list(inner)
+        while j < len(item) and _upper(item[j]) != "REFERENCES":
+            j += 1
+        if j + 1 < len(item):
+            ref_table, ref_columns, _ = _parse_references(item, j + 1)
+            table["foreign_keys"].append({
+                "columns": columns,
+                "ref_table": ref_table,
+                "ref_columns": ref_columns
+            })
+
+
+def _is_index_definition(item):
+    # MySQL "KEY idx (a)" / "INDEX (a)" versus a column that happens to be called "key".
+    if _upper(item[0]) not in _INDEX_KEYWORDS or len(item) < 2:
+        return False
+    if item[1] == ("punct", "("):
+        return True
+    return len(item) > 2 and item[2] == ("punct", "(") and _upper(item[1]) not in _TYPE_WORDS
+
+
+def _parse_column(item, table):
+    if not _is_name(item[0]):
+        return
+    column_name = item[0][1]
+    type_parts = []
+    i = 1
+    while i < len(item):
+        token = item[i]
+        # "CHARACTER SET" is a constraint, but "CHARACTER VARYING" is a type.
+        if _upper(token) in _COLUMN_CONSTRAINTS and (type_parts or _upper(token) != "CHARACTER"):
+            break
+        if token == ("punct", "("):
+            inner, i = _paren_group(item, i)
+            type_parts[-1:] = [(type_parts[-1] if type_parts else "") + "(" + "".join(v for _, v in inner) + ")"]
+            continue
+        type_parts.append(token[1])
+        i += 1
+
+    table["columns"].append(column_name)
+    table["data_types"].append(" ".join(type_parts))
+
+    while i < len(item):
+        keyword = _upper(item[i])
+        if keyword == "PRIMARY":
+            table["primary_keys"].append(column_name)
+        elif keyword == "REFERENCES" and i + 1 < len(item):
+            ref_table, ref_columns, i = _parse_references(item, i + 1)
+            table["foreign_keys"].append({
+                "columns": [column_name],
+                "ref_table": ref_table,
+                "ref_columns": ref_columns
+            })
+            continue
+        i += 1
+
+
+def parse_create_table(statement):
+    tokens = _tokenize(statement)
+    i = 0
+    if i >= len(tokens) or _upper(tokens[i]) != "CREATE":
+        return None
+    i += 1
+    while i < len(tokens) and _upper(tokens[i]) in ("TEMP", "TEMPORARY", "GLOBAL", "LOCAL", "UNLOGGED", "VIRTUAL"):
+        i += 1
+    if i >= len(tokens) or _upper(tokens[i]) != "TABLE":
+        return None
+    i += 1
+    if [_upper(t) for t in tokens[i:i + 3]] == ["IF", "NOT", "EXISTS"]:
+        i += 3
+    if i >= len(tokens) or not _is_name(tokens[i]):
+        return None
+
+    table_name, i = _qualified_name(tokens, i)
+    if i >= len(tokens) or tokens[i] != ("punct", "("):
+        return None
+    body, _ = _paren_group(tokens, i)
+
+    table = {
+        "table_name": table_name,
+        "columns": [],
+        "data_types": [],
+        "primary_keys": [],
+        "foreign_keys": []
+    }
+    for item in _split_top_level(body):
+        if not item:
+            continue
+        if _upper(item[0]) in _TABLE_CONSTRAINTS:
+            _parse_table_constraint(item, table)
+        elif _is_index_definition(item):
+            continue
+        else:
+            _parse_column(item, table)
+
+    table["primary_keys"] = list(dict.fromkeys(table["primary_keys"]))
+    unique_fks = {}
+    for fk in table["foreign_keys"]:
+        unique_fks.setdefault((tuple(fk["columns"]), fk["ref_table"], tuple(fk["ref_columns"])), fk)
+    table["foreign_keys"] = list(unique_fks.values())
+    return table
+
+
+def iter_create_tables(source, chunk_size=CHUNK_SIZE):
+    for statement in iter_statements(source, chunk_size):
+        table = parse_create_table(statement)
+        if table and table["columns"]:
+            yield table
+
+
+def extract_schema_metadata(ddl_sql):
+    return [
+        [table["table_name"], table["columns"], table["data_types"]]
+        for table in iter_create_tables(ddl_sql)
+    ]
@@ -0,0 +1,276 @@
+import os
+import threading
+import numpy as np
+
+from metadata_store import get_connection
+
+EMBEDDING_DTYPE = np.float32
+# Databases with at least this many tables are searched through an IVF index
+# instead of exactly; 0 keeps exact search everywhere.
+ANN_MIN_TABLES = int(os.getenv("ANN_MIN_TABLES", "0"))
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "8"))
+
+_cache_lock = threading.Lock()
+_index_cache = {}
+
+
+def init_embedding_index(metadata_db="metadata_store.db"):
+    conn = get_connection(metadata_db)
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS table_embeddings (
+            db_id TEXT,
+            table_name TEXT,
+            embedding BLOB,
+            PRIMARY KEY (db_id, table_name)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS column_embeddings (
+            db_id TEXT,
+            table_name TEXT,
+            column_name TEXT,
+            embedding BLOB,
+            PRIMARY KEY (db_id, table_name, column_name)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS index_meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER
+        )
+    """)
+    cursor.execute("INSERT OR IGNORE INTO index_meta (key, value) VALUES ('table_index_version', 0)")
+    conn.commit()
+
+
+def _to_blob(vector):
+    return np.ascontiguousarray(vector, dtype=EMBEDDING_DTYPE).tobytes()
+
+
+def _bump_version(cursor):
+    cursor.execute("UPDATE index_meta SET value = value + 1 WHERE key = 'table_index_version'")
+
+
+def sync_encoder(model_name, backend, metadata_db="metadata_store.db"):
+    # Vectors from another encoder, or another backend of the same one, are not
+    # comparable with new ones, so on a change every stored vector is dropped
+    # and the caller re-embeds. Returns True when the encoder changed.
+    current = {"embedding_model": model_name, "embedding_backend": backend}
+    conn = get_connection(metadata_db)
+    stored = dict(conn.execute(
+        "SELECT key, value FROM index_meta WHERE key IN ('embedding_model', 'embedding_backend')"
+    ).fetchall())
+    if stored == current:
+        return False
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM table_embeddings")
+        cursor.execute("DELETE FROM column_embeddings")
+        cursor.executemany("INSERT OR REPLACE INTO index_meta (key, value) VALUES (?, ?)", list(current.items()))
+        _bump_version(cursor)
+    return True
+
+
+def upsert_table_embeddings(entries, metadata_db="metadata_store.db"):
+    # entries: iterable of (db_id, table_name, normalized embedding)
+    rows = [(db_id, table_name, _to_blob(vec)) for db_id, table_name, vec in entries]
+    if not rows:
+        return
+    conn = get_connection(metadata_db)
+    with conn:
+        cursor = conn.cursor()
+        cursor.executemany("""
+            INSERT OR REPLACE INTO table_embeddings (db_id, table_name, embedding)
+            VALUES (?, ?, ?)
+        """, rows)
+        _bump_version(cursor)
+
+
+def delete_table_embeddings(keys, metadata_db="metadata_store.db"):
+    keys = list(keys)
+    if not keys:
+        return
+    conn = get_connection(metadata_db)
+    with conn:
+        cursor = conn.cursor()
+        cursor.executemany("DELETE FROM table_embeddings WHERE db_id = ? AND table_name = ?", keys)
+        _bump_version(cursor)
+
+
+def get_missing_tables(metadata_db="metadata_store.db"):
+    cursor = get_connection(metadata_db).execute("""
+        SELECT t.db_id, t.table_name, t.table_intent
+        FROM tables t
+        LEFT JOIN table_embeddings e
+            ON e.db_id = t.db_id AND e.table_name = t.table_name
+        WHERE e.embedding IS NULL AND t.table_intent IS NOT NULL AND t.table_intent != ''
+    """)
+    return cursor.fetchall()
+
+
+def upsert_column_embeddings(entries, metadata_db="metadata_store.db"):
+    # entries: iterable of (db_id, table_name, column_name, normalized embedding)
+    rows = [(db_id, table_name, column_name, _to_blob(vec)) for db_id, table_name, column_name, vec in entries]
+    if not rows:
+        return
+    conn = get_connection(metadata_db)
+    with conn:
+        conn.executemany("""
+            INSERT OR REPLACE INTO column_embeddings (db_id, table_name, column_name, embedding)
+            VALUES (?, ?, ?, ?)
+        """, rows)
+
+
+def delete_column_embeddings(table_keys, metadata_db="metadata_store.db"):
+    # Drops every column vector of the given (db_id, table_name) tables.
+    table_keys = list(table_keys)
+    if not table_keys:
+        return
+    conn = get_connection(metadata_db)
+    with conn:
+        conn.executemany("DELETE FROM column_embeddings WHERE db_id = ? AND table_name = ?", table_keys)
+
+
+def get_missing_columns(metadata_db="metadata_store.db"):
+    cursor = get_connection(metadata_db).execute("""
+        SELECT t.db_id, t.table_name, c.column_name, c.column_intent
+        FROM tables t
+        JOIN columns c ON c.table_id = t.table_id
+        LEFT JOIN column_embeddings e
+            ON e.db_id = t.db_id AND e.table_name = t.table_name AND e.column_name = c.column_name
+        WHERE e.embedding IS NULL
+    """)
+    return cursor.fetchall()
+
+
+def load_column_embeddings(db_id, table_names, metadata_db="metadata_store.db"):
+    table_names = list(table_names)
+    if not table_names:
+        return [], np.zeros((0, 0), dtype=EMBEDDING_DTYPE)
+    placeholders = ",".join("?" * len(table_names))
+    rows = get_connection(metadata_db).execute(f"""
+        SELECT table_name, column_name, embedding
+        FROM column_embeddings
+        WHERE db_id = ? AND table_name IN ({placeholders})
+    """, [db_id] + table_names).fetchall()
+
+    keys = [(table_name, column_name) for table_name, column_name, _ in rows]
+    if rows:
+        matrix = np.vstack([np.frombuffer(blob, dtype=EMBEDDING_DTYPE) for _, _, blob in rows])
+    else:
+        matrix = np.zeros((0, 0), dtype=EMBEDDING_DTYPE)
+    return keys, matrix
+
+
+def _index_version(cursor):
+    cursor.execute("SELECT value FROM index_meta WHERE key = 'table_index_version'")
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def _load_index(metadata_db):
+    cursor = get_connection(metadata_db).cursor()
+    version = _index_version(cursor)
+
+    with _cache_lock:
+        cached = _index_cache.get(metadata_db)
+        if cached and cached["version"] == version:
+            return cached
+
+    cursor.execute("SELECT db_id, table_name, embedding FROM table_embeddings ORDER BY db_id, table_name")
+    rows = cursor.fetchall()
+
+    keys = [(db_id, table_name) for db_id, table_name, _ in rows]
+    if rows:
+        matrix = np.vstack([np.frombuffer(blob, dtype=EMBEDDING_DTYPE) for _, _, blob in rows])
+    else:
+        matrix = np.zeros((0, 0), dtype=EMBEDDING_DTYPE)
+
+    # Rows are sorted by db_id, so each database is a contiguous slice of the matrix.
+    partitions = {}
+    for i, (db_id, _) in enumerate(keys):
+        start = partitions[db_id].start if db_id in partitions else i
+        partitions[db_id] = slice(start, i + 1)
+
+    cached = {"version": version, "keys": keys, "matrix": matrix, "partitions": partitions, "ann": {}}
+    with _cache_lock:
+        _index_cache[metadata_db] = cached
+    return cached
+
+
+def _partition(index, db_id):
+    if db_id is None:
+        return index["keys"], index["matrix"]
+    part = index["partitions"].get(db_id)
+    if part is None:
+        return [], np.zeros((0, 0), dtype=EMBEDDING_DTYPE)
+    return index["keys"][part], index["matrix"][part]
+
+
+def load_table_index(metadata_db="metadata_store.db", db_id=None):
+    return _partition(_load_index(metadata_db), db_id)
+
+
+def top_k_indices(scores, top_k):
+    if top_k >= len(scores):
+        return np.argsort(-scores)
+    candidates = np.argpartition(-scores, top_k)[:top_k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+class IVFIndex:
+    # Inverted-file index: spherical k-means splits the vectors into n_lists
+    # cells and a search only scores the n_probe cells closest to the query.
+    def __init__(self, matrix, n_lists=None, n_probe=ANN_NPROBE, iterations=10, seed=0):
+        n = len(matrix)
+        n_lists = min(n, n_lists or max(1, int(np.sqrt(n))))
+        rng = np.random.default_rng(seed)
+        sample = matrix[rng.choice(n, min(n, 64 * n_lists), replace=False)]
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            filled = np.bincount(assign, minlength=n_lists) > 0
+            norms = np.linalg.norm(sums[filled], axis=1, keepdims=True)
+            centroids[filled] = sums[filled] / np.where(norms == 0, 1, norms)
+
+        assign = np.argmax(matrix @ centroids.T, axis=1)
+        self.ids = np.argsort(assign, kind="stable")
+        self.vectors = matrix[self.ids]
+        self.offsets = np.searchsorted(assign[self.ids], np.arange(n_lists + 1))
+        self.centroids = centroids
+        self.n_probe = n_probe
+
+    def search(self, query, top_k, n_probe=None):
+        cells = top_k_indices(self.centroids @ query, n_probe or self.n_probe)
+        candidates = np.concatenate([np.arange(self.offsets[c], self.offsets[c + 1]) for c in cells])
+        scores = self.vectors[candidates] @ query
+        best = top_k_indices(scores, top_k)
+        return self.ids[candidates[best]], scores[best]
+
+
+def _ann_index(index, db_id, matrix):
+    with _cache_lock:
+        ann = index["ann"].get(db_id)
+    if ann is None:
+        ann = IVFIndex(matrix)
+        with _cache_lock:
+            index["ann"][db_id] = ann
+    return ann
+
+
+def search_tables(query_vector, top_k=4, metadata_db="metadata_store.db", db_id=None):
+    # With a db_id only that database's tables are scored; without one, every
+    # table in the store is.
+    index = _load_index(metadata_db)
+    keys, matrix = _partition(index, db_id)
+    if not keys:
+        return []
+    query = np.asarray(query_vector, dtype=EMBEDDING_DTYPE).reshape(-1)
+    if db_id is not None and ANN_MIN_TABLES and len(keys) >= ANN_MIN_TABLES:
+        ids, scores = _ann_index(index, db_id, matrix).search(query, top_k)
+        return [(float(score), keys[i][0], keys[i][1]) for i, score in zip(ids, scores)]
+    scores = matrix @ query
+    return [(float(scores[i]), keys[i][0], keys[i][1]) for i in top_k_indices(scores, top_k)]
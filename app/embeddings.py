@@ -0,0 +1,41 @@
+import os
+import threading
+import time
+
+from inference_backends import INFERENCE_BACKEND, load_sentence_encoder
+from telemetry import log_event
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", INFERENCE_BACKEND)
+
+_model = None
+_model_lock = threading.Lock()
+load_timings = {}
+
+
+def get_embedding_model():
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                start = time.perf_counter()
+                import sentence_transformers
+                load_timings["import_seconds"] = time.perf_counter() - start
+                _model = load_sentence_encoder(EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND)
+                load_timings["load_seconds"] = time.perf_counter() - start
+                log_event("model_loaded", model=EMBEDDING_MODEL_NAME, backend=EMBEDDING_BACKEND,
+                          load_seconds=round(load_timings["load_seconds"], 3))
+    return _model
+
+
+def encode(texts, batch_size=64):
+    return get_embedding_model().encode(
+        texts, batch_size=batch_size, normalize_embeddings=True, convert_to_numpy=True
+    )
+
+
+def warm_up():
+    start = time.perf_counter()
+    encode(["warm up"])
+    load_timings["warm_up_seconds"] = time.perf_counter() - start
+    return load_timings
@@ -0,0 +1,105 @@
+import os
+
+# torch: eager fp32; torch-int8: eager with Linear layers dynamically quantized;
+# onnx: ONNX Runtime fp32; onnx-int8: ONNX Runtime with dynamically quantized weights.
+BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+MODEL_DIR = os.getenv("MODEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "models"))
+QUERY_MODEL_NAME = os.getenv("QUERY_MODEL_NAME", "rajiv8197/codet5p_sql_finetuned")
+HF_TOKEN = os.getenv("HF_TOKEN")
+# ONNX Runtime quantization target: avx2, avx512, avx512_vnni or arm64.
+ONNX_QUANT_CONFIG = os.getenv("ONNX_QUANT_CONFIG", "avx2")
+
+
+def _check_backend(backend):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend {backend!r}; choose one of {', '.join(BACKENDS)}")
+
+
+def export_dir(model_name, backend):
+    return os.path.join(MODEL_DIR, backend, model_name.replace("/", "__"))
+
+
+def _quantize_linear(model):
+    import torch
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def export_sentence_encoder(model_name, backend):
+    # Writes an ONNX (optionally int8) copy of a sentence-transformers model.
+    _check_backend(backend)
+    if not backend.startswith("onnx"):
+        return None
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    path = export_dir(model_name, backend)
+    model = SentenceTransformer(model_name, backend="onnx")
+    model.save(path)
+    if backend == "onnx-int8":
+        export_dynamic_quantized_onnx_model(model, ONNX_QUANT_CONFIG, path)
+    return path
+
+
+def load_sentence_encoder(model_name, backend=INFERENCE_BACKEND):
+    _check_backend(backend)
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "torch":
+        return SentenceTransformer(model_name)
+    if backend == "torch-int8":
+        return _quantize_linear(SentenceTransformer(model_name))
+
+    path = export_dir(model_name, backend)
+    if not os.path.isdir(path):
+        raise FileNotFoundError(f"No {backend} export of {model_name} at {path}; run server/export_models.py first")
+    file_name = os.path.join("onnx", f"model_qint8_{ONNX_QUANT_CONFIG}.onnx") if backend == "onnx-int8" else "onnx/model.onnx"
+    return SentenceTransformer(path, backend="onnx", model_kwargs={"file_name": file_name})
+
+
+def export_seq2seq(model_name, backend, token=None):
+    # Exports encoder/decoder ONNX graphs with optimum; onnx-int8 also quantizes
+    # every graph's weights to int8.
+    _check_backend(backend)
+    if not backend.startswith("onnx"):
+        return None
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+
+    path = export_dir(model_name, backend)
+    model = ORTModelForSeq2SeqLM.from_pretrained(model_name, export=True, token=token)
+    tokenizer = AutoTokenizer.from_pretrained(model_name, token=token)
+    model.save_pretrained(path)
+    tokenizer.save_pretrained(path)
+
+    if backend == "onnx-int8":
+        qconfig = getattr(AutoQuantizationConfig, ONNX_QUANT_CONFIG)(is_static=False, per_channel=False)
+        for file_name in sorted(os.listdir(path)):
+            if file_name.endswith(".onnx"):
+                quantizer = ORTQuantizer.from_pretrained(path, file_name=file_name)
+                quantizer.quantize(save_dir=path, quantization_config=qconfig)
+                # Keep only the quantized graph under the original name.
+                os.replace(os.path.join(path, file_name.replace(".onnx", "_quantized.onnx")),
+                           os.path.join(path, file_name))
+    return path
+
+
+def load_seq2seq(model_name, backend=INFERENCE_BACKEND, token=None):
+    # Returns (tokenizer, model); every backend's model supports generate().
+    _check_backend(backend)
+    from transformers import AutoTokenizer
+
+    if backend.startswith("torch"):
+        from transformers import AutoModelForSeq2SeqLM
+
+        tokenizer = AutoTokenizer.from_pretrained(model_name, token=token)
+        model = AutoModelForSeq2SeqLM.from_pretrained(model_name, token=token)
+        model.eval()
+        return tokenizer, _quantize_linear(model) if backend == "torch-int8" else model
+
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+
+    path = export_dir(model_name, backend)
+    if not os.path.isdir(path):
+        raise FileNotFoundError(f"No {backend} export of {model_name} at {path}; run server/export_models.py first")
+    return AutoTokenizer.from_pretrained(path), ORTModelForSeq2SeqLM.from_pretrained(path)
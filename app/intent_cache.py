@@ -0,0 +1,98 @@
+import hashlib
+import json
+import threading
+
+from metadata_store import get_connection
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def init_intent_cache(metadata_db="metadata_store.db"):
+    conn = get_connection(metadata_db)
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS intent_cache (
+            cache_key TEXT PRIMARY KEY,
+            model_name TEXT,
+            prompt_version TEXT,
+            table_intent TEXT,
+            column_intents TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.commit()
+
+
+def intent_cache_key(table_name, columns, data_types, model_name, prompt_version):
+    normalized = {
+        "table": table_name.strip().lower(),
+        "columns": [
+            [col.strip().lower(), (dtype or "").strip().upper()]
+            for col, dtype in zip(columns, data_types)
+        ],
+        "model": model_name,
+        "prompt": prompt_version,
+    }
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def lookup_intents(keys, metadata_db="metadata_store.db"):
+    keys = list(keys)
+    if not keys:
+        return {}
+    init_intent_cache(metadata_db)
+    cursor = get_connection(metadata_db).cursor()
+    found = {}
+    # Stay well under SQLite's bound-parameter limit.
+    for i in range(0, len(keys), 500):
+        chunk = keys[i:i + 500]
+        cursor.execute(f"""
+            SELECT cache_key, table_intent, column_intents
+            FROM intent_cache
+            WHERE cache_key IN ({",".join("?" * len(chunk))})
+        """, chunk)
+        for cache_key, table_intent, column_intents in cursor.fetchall():
+            found[cache_key] = (table_intent, json.loads(column_intents))
+
+    with _stats_lock:
+        _stats["hits"] += len(found)
+        _stats["misses"] += len(keys) - len(found)
+    return found
+
+
+def store_intents(entries, model_name, prompt_version, metadata_db="metadata_store.db"):
+    # entries: iterable of (cache_key, table_intent, column_intents)
+    rows = [
+        (key, model_name, prompt_version, table_intent, json.dumps(column_intents or {}))
+        for key, table_intent, column_intents in entries
+    ]
+    if not rows:
+        return
+    init_intent_cache(metadata_db)
+    conn = get_connection(metadata_db)
+    with conn:
+        conn.executemany("""
+            INSERT OR REPLACE INTO intent_cache (cache_key, model_name, prompt_version, table_intent, column_intents)
+            VALUES (?, ?, ?, ?, ?)
+        """, rows)
+
+
+def invalidate_intent_cache(keep_prompt_version=None, metadata_db="metadata_store.db"):
+    # Drops entries generated with any other prompt version, or everything if none is given.
+    init_intent_cache(metadata_db)
+    conn = get_connection(metadata_db)
+    with conn:
+        if keep_prompt_version is None:
+            cursor = conn.execute("DELETE FROM intent_cache")
+        else:
+            cursor = conn.execute("DELETE FROM intent_cache WHERE prompt_version != ?", (keep_prompt_version,))
+    return cursor.rowcount
+
+
+def get_intent_cache_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    total = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / total if total else 0.0
+    return stats
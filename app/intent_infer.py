@@ -1,11 +1,39 @@
-from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
+import contextvars
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from intent_cache import intent_cache_key, lookup_intents, store_intents, invalidate_intent_cache
+from telemetry import span, increment
 
 MODEL_NAME = "microsoft/phi-1_5"
 
-def _load_intent_model():
-    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-    model = AutoModelForCausalLM.from_pretrained(MODEL_NAME, torch_dtype="auto")
+_llm = None
+_llm_lock = threading.Lock()
+
+API_TIMEOUT = (5, 300)
+API_MAX_RETRIES = 3
+API_MAX_WORKERS = 4
+API_BATCH_SIZE = 8
+
+INTENT_CACHE_DB = "metadata_store.db"
+
+_session = None
+_session_lock = threading.Lock()
+
+def _load_intent_model(model_name=MODEL_NAME):
+    from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    # Left padding so batched prompts all end right where generation starts.
+    tokenizer.padding_side = "left"
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    model = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype="auto")
 
     llm = pipeline(
         "text-generation",
@@ -18,10 +46,16 @@ def _load_intent_model():
     return llm
 
 
-def generate_intents(table_name, columns, data_types, llm=None):
-    if not llm:
-        llm = _load_intent_model(MODEL_NAME)
-    few_shot_prompt = """
+def get_intent_model():
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None:
+                _llm = _load_intent_model(MODEL_NAME)
+    return _llm
+
+
+FEW_SHOT_PROMPT = """
 You're a helpful assistant. You are given the name of a SQL table and a list of columns with their types. 
 Your task is to describe the likely purpose of this table in one sentence, and then describe what each listed column likely represents.
 
@@ -64,18 +98,24 @@ Column Descriptions:
 ---
 """.strip()
 
+# Part of every intent cache key, so editing the few-shot prompt invalidates old entries.
+PROMPT_VERSION = hashlib.sha256(FEW_SHOT_PROMPT.encode("utf-8")).hexdigest()[:12]
+
+
+def build_intent_prompt(table_name, columns, data_types):
     column_lines = "\n".join(
         [f"- {col} ({dtype})" for col, dtype in zip(columns, data_types)]
     )
 
-    prompt = (
-        f"{few_shot_prompt}\n\n"
+    return (
+        f"{FEW_SHOT_PROMPT}\n\n"
         f"Table: {table_name}\n"
         f"Columns:\n{column_lines}\n\n"
         f"Table Purpose:\n"
     )
 
-    result = llm(prompt, return_full_text=False)[0]["generated_text"]
+
+def parse_intents(result, columns):
     generated = result.strip()
 
     # Post-processing
@@ -107,18 +147,143 @@ Column Descriptions:
     return table_intent, column_intents
 
 
-def call_generate_intents_api(api_url, table_name, columns, data_types):
+def _cache_key(table):
+    table_name, columns, data_types = table
+    return intent_cache_key(table_name, columns, data_types, MODEL_NAME, PROMPT_VERSION)
+
+
+def _store_in_cache(tables, results, cache_db):
+    store_intents(
+        [(_cache_key(table), table_intent, column_intents)
+         for table, (table_intent, column_intents) in zip(tables, results)],
+        MODEL_NAME, PROMPT_VERSION, cache_db
+    )
+
+
+def purge_stale_intents(cache_db=INTENT_CACHE_DB):
+    return invalidate_intent_cache(PROMPT_VERSION, cache_db)
+
+
+def generate_intents(table_name, columns, data_types, llm=None, cache_db=INTENT_CACHE_DB):
+    return generate_intents_batch([(table_name, columns, data_types)], llm=llm, cache_db=cache_db)[0]
+
+
+def generate_intents_batch(tables, llm=None, batch_size=API_BATCH_SIZE, cache_db=INTENT_CACHE_DB):
+    # tables: list of (table_name, columns, data_types)
+    if not tables:
+        return []
+    results = [None] * len(tables)
+    misses = list(range(len(tables)))
+    if cache_db:
+        keys = [_cache_key(table) for table in tables]
+        cached = lookup_intents(keys, cache_db)
+        results = [cached.get(key) for key in keys]
+        misses = [i for i in misses if results[i] is None]
+    if not misses:
+        return results
+
+    if not llm:
+        llm = get_intent_model()
+    prompts = [build_intent_prompt(*tables[i]) for i in misses]
+    outputs = llm(prompts, batch_size=batch_size, return_full_text=False)
+    for i, output in zip(misses, outputs):
+        results[i] = parse_intents(output[0]["generated_text"], tables[i][1])
+
+    if cache_db:
+        _store_in_cache([tables[i] for i in misses], [results[i] for i in misses], cache_db)
+    return results
+
+
+def get_api_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                retry = Retry(
+                    total=API_MAX_RETRIES,
+                    backoff_factor=0.5,
+                    status_forcelist=[429, 500, 502, 503, 504],
+                    allowed_methods=["POST"]
+                )
+                adapter = HTTPAdapter(pool_connections=API_MAX_WORKERS, pool_maxsize=API_MAX_WORKERS, max_retries=retry)
+                session = requests.Session()
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.headers.update({"Content-Type": "application/json"})
+                _session = session
+    return _session
+
+
+def call_generate_intents_api(api_url, table_name, columns, data_types, timeout=API_TIMEOUT):
     endpoint = f"{api_url}/generate_intents"
-    headers = {"Content-Type": "application/json"}
     payload = {
         "table_name": table_name,
         "columns": columns,
         "data_types": data_types
     }
 
-    response = requests.post(endpoint, json=payload, headers=headers)
-    print("Response:\n", response.json())
+    with span("model_server_call", endpoint="generate_intents"):
+        response = get_api_session().post(endpoint, json=payload, timeout=timeout)
+    increment("model_server_responses_total", endpoint="generate_intents", status=response.status_code)
     if response.status_code == 200:
         return response.json()
     else:
         raise Exception(f"API Error {response.status_code}: {response.text}")
+
+
+def call_generate_intents_batch_api(api_url, tables, timeout=API_TIMEOUT):
+    endpoint = f"{api_url}/generate_intents_batch"
+    payload = {
+        "tables": [
+            {"table_name": table_name, "columns": columns, "data_types": data_types}
+            for table_name, columns, data_types in tables
+        ]
+    }
+
+    with span("model_server_call", endpoint="generate_intents_batch", tables=len(tables)):
+        response = get_api_session().post(endpoint, json=payload, timeout=timeout)
+    increment("model_server_responses_total", endpoint="generate_intents_batch", status=response.status_code)
+    if response.status_code == 200:
+        return response.json()["results"]
+    elif response.status_code == 404:
+        # Older model servers only expose the single-table endpoint.
+        return [call_generate_intents_api(api_url, *table, timeout=timeout) for table in tables]
+    else:
+        raise Exception(f"API Error {response.status_code}: {response.text}")
+
+
+def iter_generate_intents(api_url, tables, batch_size=API_BATCH_SIZE, max_workers=API_MAX_WORKERS,
+                          cache_db=INTENT_CACHE_DB):
+    # Yields (index, response) as each table resolves so callers can report per-table progress.
+    misses = list(range(len(tables)))
+    if cache_db:
+        cached = lookup_intents([_cache_key(table) for table in tables], cache_db)
+        misses = []
+        for i, table in enumerate(tables):
+            hit = cached.get(_cache_key(table))
+            if hit:
+                yield i, {"table_intent": hit[0], "column_intents": hit[1]}
+            else:
+                misses.append(i)
+
+    batches = [misses[i:i + batch_size] for i in range(0, len(misses), batch_size)]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Each request runs in its own copy of the caller's context, so its
+        # spans land in the caller's trace.
+        futures = {
+            executor.submit(
+                contextvars.copy_context().run, call_generate_intents_batch_api, api_url, [tables[i] for i in batch]
+            ): batch
+            for batch in batches
+        }
+        for future in as_completed(futures):
+            batch = futures[future]
+            responses = future.result()
+            if cache_db:
+                _store_in_cache(
+                    [tables[i] for i in batch],
+                    [(r.get("table_intent"), r.get("column_intents")) for r in responses],
+                    cache_db
+                )
+            for index, response in zip(batch, responses):
+                yield index, response
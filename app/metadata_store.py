@@ -0,0 +1,211 @@
+import json
+import os
+import sqlite3
+import threading
+
+_local = threading.local()
+
+
+def get_connection(metadata_db="metadata_store.db"):
+    # One connection per (thread, database file), reused across calls.
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    key = os.path.abspath(metadata_db)
+    conn = connections.get(key)
+    if conn is None:
+        conn = sqlite3.connect(metadata_db)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        connections[key] = conn
+    return conn
+
+
+def close_connections():
+    for conn in getattr(_local, "connections", {}).values():
+        conn.close()
+    _local.connections = {}
+
+
+def init_schema(metadata_db="metadata_store.db"):
+    conn = get_connection(metadata_db)
+    with conn:
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS databases (
+                db_id TEXT PRIMARY KEY,
+                schema_version INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS tables (
+                table_id INTEGER PRIMARY KEY,
+                db_id TEXT NOT NULL REFERENCES databases(db_id) ON DELETE CASCADE,
+                table_name TEXT NOT NULL,
+                table_intent TEXT,
+                row_count INTEGER,
+                UNIQUE (db_id, table_name) -- doubles as the (db_id, table_name) lookup index
+            );
+            CREATE TABLE IF NOT EXISTS columns (
+                table_id INTEGER NOT NULL REFERENCES tables(table_id) ON DELETE CASCADE,
+                position INTEGER NOT NULL,
+                column_name TEXT NOT NULL,
+                data_type TEXT,
+                column_intent TEXT,
+                is_primary_key INTEGER NOT NULL DEFAULT 0,
+                ref_table TEXT,
+                ref_column TEXT,
+                sample_values TEXT,
+                PRIMARY KEY (table_id, position)
+            );
+        """)
+    _add_missing_columns(conn, "databases", {"schema_version": "INTEGER NOT NULL DEFAULT 0"})
+    _add_missing_columns(conn, "tables", {"row_count": "INTEGER"})
+    _add_missing_columns(conn, "columns", {
+        "is_primary_key": "INTEGER NOT NULL DEFAULT 0",
+        "ref_table": "TEXT",
+        "ref_column": "TEXT",
+        "sample_values": "TEXT"
+    })
+    _migrate_flat_metadata(conn)
+    with conn:
+        conn.execute("""
+            CREATE VIEW IF NOT EXISTS metadata AS
+            SELECT t.db_id, t.table_name, c.column_name, c.data_type, t.table_intent, c.column_intent
+            FROM tables t
+            JOIN columns c ON c.table_id = t.table_id
+        """)
+
+
+def _add_missing_columns(conn, table, columns):
+    # Upgrades stores created by earlier versions of this schema in place.
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    with conn:
+        for name, definition in columns.items():
+            if name not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+
+
+def _migrate_flat_metadata(conn):
+    # Stores created before normalization kept everything in one flat `metadata` table.
+    row = conn.execute("SELECT type FROM sqlite_master WHERE name = 'metadata'").fetchone()
+    if not row or row[0] != "table":
+        return
+    rows = conn.execute("""
+        SELECT db_id, table_name, column_name, data_type, table_intent, column_intent
+        FROM metadata
+        ORDER BY rowid
+    """).fetchall()
+    # Re-running inference used to append the same columns again; the last
+    # copy of each (db_id, table_name, column_name) wins, in first-seen order,
+    # and so does the last table intent, so one table never mixes uploads.
+    latest = {}
+    table_intents = {}
+    for db_id, table_name, column_name, data_type, table_intent, column_intent in rows:
+        latest[(db_id, table_name, column_name)] = {
+            "db_id": db_id,
+            "table_name": table_name,
+            "column_name": column_name,
+            "data_type": data_type,
+            "column_intent": column_intent
+        }
+        table_intents[(db_id, table_name)] = table_intent
+    entries = [
+        {**entry, "table_intent": table_intents[(entry["db_id"], entry["table_name"])]}
+        for entry in latest.values()
+    ]
+    with conn:
+        conn.execute("DROP TABLE metadata")
+        replace_tables(conn, entries)
+
+
+def replace_tables(conn, metadata_list, removed_tables=()):
+    # Must be called inside a transaction. Rows replace whatever is stored for
+    # their (db_id, table_name); removed_tables are (db_id, table_name) pairs to drop.
+    # Returns the db_ids that were deleted because no tables were left.
+    tables = {}
+    for entry in metadata_list:
+        key = (entry["db_id"], entry["table_name"])
+        table = tables.setdefault(key, {"table_intent": None, "row_count": None, "columns": []})
+        if entry.get("table_intent"):
+            table["table_intent"] = entry["table_intent"]
+        if entry.get("row_count") is not None:
+            table["row_count"] = entry["row_count"]
+        table["columns"].append(entry)
+
+    conn.executemany(
+        "DELETE FROM tables WHERE db_id = ? AND table_name = ?",
+        list(tables) + list(removed_tables)
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO databases (db_id) VALUES (?)",
+        {(db_id,) for db_id, _ in tables}
+    )
+    conn.executemany(
+        "UPDATE databases SET schema_version = schema_version + 1 WHERE db_id = ?",
+        {(db_id,) for db_id, _ in list(tables) + list(removed_tables)}
+    )
+    conn.executemany(
+        "INSERT INTO tables (db_id, table_name, table_intent, row_count) VALUES (?, ?, ?, ?)",
+        [
+            (db_id, table_name, table["table_intent"], table["row_count"])
+            for (db_id, table_name), table in tables.items()
+        ]
+    )
+
+    table_ids = {}
+    for db_id in {db_id for db_id, _ in tables}:
+        for table_id, table_name in conn.execute(
+            "SELECT table_id, table_name FROM tables WHERE db_id = ?", (db_id,)
+        ):
+            table_ids[(db_id, table_name)] = table_id
+
+    conn.executemany("""
+        INSERT INTO columns (
+            table_id, position, column_name, data_type, column_intent,
+            is_primary_key, ref_table, ref_column, sample_values
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (
+            table_ids[key],
+            position,
+            entry["column_name"],
+            entry["data_type"],
+            entry.get("column_intent"),
+            1 if entry.get("is_primary_key") else 0,
+            entry.get("ref_table"),
+            entry.get("ref_column"),
+            json.dumps(entry["sample_values"]) if entry.get("sample_values") is not None else None
+        )
+        for key, table in tables.items()
+        for position, entry in enumerate(table["columns"])
+    ])
+
+    emptied = [
+        db_id for db_id in sorted({db_id for db_id, _ in removed_tables})
+        if not conn.execute("SELECT 1 FROM tables WHERE db_id = ? LIMIT 1", (db_id,)).fetchone()
+    ]
+    conn.executemany("DELETE FROM databases WHERE db_id = ?", [(db_id,) for db_id in emptied])
+    return emptied
+
+
+def get_schema_version(db_id, metadata_db="metadata_store.db"):
+    row = get_connection(metadata_db).execute(
+        "SELECT schema_version FROM databases WHERE db_id = ?", (db_id,)
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def fetch_schema_rows(db_id, table_names, metadata_db="metadata_store.db"):
+    # Full schema block for a set of tables in a single query.
+    table_names = list(table_names)
+    if not table_names:
+        return []
+    placeholders = ",".join("?" * len(table_names))
+    return get_connection(metadata_db).execute(f"""
+        SELECT t.table_name, t.table_intent, c.column_name, c.data_type, c.column_intent,
+               c.is_primary_key, c.ref_table
+        FROM tables t
+        LEFT JOIN columns c ON c.table_id = t.table_id
+        WHERE t.db_id = ? AND t.table_name IN ({placeholders})
+        ORDER BY t.table_id, c.position
+    """, [db_id] + table_names).fetchall()
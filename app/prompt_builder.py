@@ -0,0 +1,157 @@
+import os
+import threading
+
+from answer_cache import LRUCache
+
+PROMPT_TOKENIZER_NAME = os.getenv("PROMPT_TOKENIZER_NAME", "Salesforce/codet5p-770m")
+# Matches the max_length the SQL model was fine-tuned with.
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "768"))
+BLOCK_CACHE_MAX_ENTRIES = int(os.getenv("PROMPT_BLOCK_CACHE_MAX_ENTRIES", "4096"))
+
+_tokenizer = None
+_tokenizer_lock = threading.Lock()
+block_cache = LRUCache(BLOCK_CACHE_MAX_ENTRIES, 0)
+
+
+def get_prompt_tokenizer():
+    global _tokenizer
+    if _tokenizer is None:
+        with _tokenizer_lock:
+            if _tokenizer is None:
+                from transformers import AutoTokenizer
+                _tokenizer = AutoTokenizer.from_pretrained(PROMPT_TOKENIZER_NAME)
+    return _tokenizer
+
+
+def count_tokens(text, add_special_tokens=True):
+    return len(get_prompt_tokenizer()(text, add_special_tokens=add_special_tokens)["input_ids"])
+
+
+def _line(text):
+    # Rendered line plus its token count, including the newline that joins it.
+    return text, count_tokens(text + "\n", add_special_tokens=False)
+
+
+def _render_table_block(table):
+    header = _line(f"### Table Schema: {table['table_name']} - {table['table_intent']}")
+    columns = {}
+    for col in table["columns"] + table.get("omitted_columns", []):
+        col_name, col_type = col.split(" (", 1)
+        col_type = col_type.rstrip(")")
+        col_intent = table["column_intents"].get(col_name.lower(), "")
+        columns[col] = _line(f"- {col_name} ({col_type}): {col_intent}")
+    return {"header": header, "columns": columns}
+
+
+def get_table_block(db_id, table, schema_version=None):
+    # Blocks are memoized per (db_id, table, schema version); without a version
+    # the table is rendered fresh every time.
+    if schema_version is None:
+        return _render_table_block(table)
+    key = (db_id, table["table_name"], schema_version)
+    block = block_cache.get(key)
+    if block is None:
+        block = _render_table_block(table)
+        block_cache.put(key, block)
+    return block
+
+
+def invalidate_table_blocks(db_id):
+    return block_cache.invalidate(lambda key, value: key[0] == db_id)
+
+
+def _schema_lines(db, tables):
+    lines = [f"### Database: {db}", ""]
+    for block, columns in tables:
+        lines.append(block["header"][0])
+        lines.extend(block["columns"][col][0] for col in columns)
+        lines.append("")
+    return lines
+
+
+def _question_lines(question, include_sql):
+    return [f"### Question: {question}"] + (["### SQL:"] if include_sql else [])
+
+
+def _render(db, question, tables, include_sql):
+    return "\n".join(_schema_lines(db, tables) + _question_lines(question, include_sql))
+
+
+def render_schema_prefix(db, db_schema, schema_version=None):
+    # Everything before the question line, exactly as an untrimmed prompt renders it;
+    # prefix + render_question(question) == build_prompt(question, db, db_schema).
+    blocks = [get_table_block(db, table, schema_version) for table in db_schema]
+    return "\n".join(_schema_lines(db, [(block, table["columns"]) for block, table in zip(blocks, db_schema)])) + "\n"
+
+
+def render_question(question, include_sql=True):
+    return "\n".join(_question_lines(question, include_sql))
+
+
+def _drop_order(db_schema):
+    # Non-key columns go first, lowest question similarity first; columns
+    # without a score go from the back of the lowest-ranked table.
+    candidates = []
+    for t, table in enumerate(db_schema):
+        scores = table.get("column_scores", {})
+        key_columns = table.get("key_columns", set())
+        for c, col in enumerate(table["columns"]):
+            col_name = col.split(" (", 1)[0]
+            if col_name.lower() in key_columns:
+                continue
+            candidates.append((scores.get(col_name, float("-inf")), -t, -c, t, col))
+    candidates.sort()
+    return [(t, col) for *_, t, col in candidates]
+
+
+def assemble_prompt(question, db, db_schema, schema_version=None, token_budget=PROMPT_TOKEN_BUDGET,
+                    include_sql=True):
+    # db_schema is ordered by table relevance. When the prompt is over budget,
+    # low-scoring columns are dropped first, then whole tables from the end.
+    # The database and question lines are never dropped.
+    blocks = [get_table_block(db, table, schema_version) for table in db_schema]
+    kept = [list(table["columns"]) for table in db_schema]
+    result = {"dropped_columns": 0, "dropped_tables": 0, "over_budget": False}
+
+    def render():
+        return _render(db, question, [(blocks[t], kept[t]) for t in range(len(blocks)) if kept[t] is not None],
+                       include_sql)
+
+    prompt = render()
+    if not token_budget:
+        result.update(prompt=prompt, tokens=None)
+        return result
+
+    tokens = count_tokens(prompt)
+    if tokens > token_budget:
+        drops = [("column", t, col) for t, col in _drop_order(db_schema)]
+        drops += [("table", t, None) for t in reversed(range(len(db_schema)))]
+        # Cached per-line counts pick how much to drop; the exact count of the
+        # rendered prompt decides when to stop.
+        estimate = tokens
+        for kind, t, col in drops:
+            if kept[t] is None:
+                continue
+            if kind == "column":
+                kept[t].remove(col)
+                estimate -= blocks[t]["columns"][col][1]
+                result["dropped_columns"] += 1
+            else:
+                estimate -= blocks[t]["header"][1] + sum(blocks[t]["columns"][c][1] for c in kept[t]) + 1
+                kept[t] = None
+                result["dropped_tables"] += 1
+            if estimate <= token_budget:
+                tokens = count_tokens(render())
+                if tokens <= token_budget:
+                    break
+                estimate = tokens
+        prompt = render()
+        tokens = count_tokens(prompt)
+        result["over_budget"] = tokens > token_budget
+
+    result.update(prompt=prompt, tokens=tokens)
+    return result
+
+
+def build_prompt(question, db, db_schema, include_sql=True, schema_version=None, token_budget=None):
+    return assemble_prompt(question, db, db_schema, schema_version, token_budget, include_sql)["prompt"]
@@ -0,0 +1,92 @@
+import os
+import time
+
+import sqlparse
+from sqlparse import tokens as T
+
+MAX_ROWS = int(os.getenv("SQL_MAX_ROWS", "10000"))
+TIME_BUDGET_SECONDS = float(os.getenv("SQL_TIME_BUDGET_SECONDS", "10"))
+VM_STEP_BUDGET = int(os.getenv("SQL_VM_STEP_BUDGET", "0")) or None
+BLOCK_CARTESIAN = os.getenv("SQL_BLOCK_CARTESIAN", "0") == "1"
+PROGRESS_INTERVAL = 10000
+
+
+class QueryRejected(Exception):
+    pass
+
+
+def _statement_sql(stmt):
+    # The statement without comments or terminator: a trailing "-- ..." would
+    # otherwise count as a statement of its own or end up after the ";".
+    text = "".join(" " if tok.ttype in T.Comment else tok.value for tok in stmt.flatten())
+    return text.strip().rstrip(";").strip()
+
+
+def _parse_single_statement(sql):
+    statements = [stmt for stmt in sqlparse.parse(sql) if _statement_sql(stmt)]
+    if len(statements) != 1:
+        raise QueryRejected(f"Expected exactly one SQL statement, got {len(statements)}")
+    return statements[0]
+
+
+def _has_top_level_limit(stmt):
+    return any(tok.ttype is T.Keyword and tok.normalized == "LIMIT" for tok in stmt.tokens)
+
+
+def check_statement(sql):
+    stmt = _parse_single_statement(sql)
+    if stmt.get_type() != "SELECT":
+        raise QueryRejected(f"Only SELECT statements are allowed, got {stmt.get_type()}")
+    return stmt
+
+
+def apply_row_limit(sql, max_rows=MAX_ROWS):
+    stmt = check_statement(sql)
+    sql = _statement_sql(stmt)
+    if not max_rows or _has_top_level_limit(stmt):
+        return sql, False
+    return f"{sql}\nLIMIT {int(max_rows)}", True
+
+
+def inspect_plan(conn, sql):
+    plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()]
+    full_scans = [
+        detail for detail in plan
+        if detail.startswith("SCAN ") and "INDEX" not in detail
+    ]
+    warnings = [f"Full table scan: {detail[5:]}" for detail in full_scans]
+    if len(full_scans) > 1:
+        warnings.append("Multiple full scans in one query: likely a cartesian product or unindexed join")
+    return plan, warnings, len(full_scans) > 1
+
+
+def make_progress_handler(time_budget=TIME_BUDGET_SECONDS, step_budget=VM_STEP_BUDGET):
+    # SQLite calls the handler every PROGRESS_INTERVAL VM steps; a truthy
+    # return value interrupts the running statement.
+    state = {"deadline": time.monotonic() + time_budget if time_budget else None, "steps": 0, "reason": None}
+
+    def handler():
+        state["steps"] += PROGRESS_INTERVAL
+        if state["deadline"] and time.monotonic() > state["deadline"]:
+            state["reason"] = f"exceeded the {time_budget:g}s time budget"
+            return 1
+        if step_budget and state["steps"] > step_budget:
+            state["reason"] = f"exceeded the {step_budget} VM step budget"
+            return 1
+        return 0
+
+    return handler, state
+
+
+def govern(conn, sql, max_rows=MAX_ROWS, block_cartesian=BLOCK_CARTESIAN):
+    governed_sql, limit_applied = apply_row_limit(sql, max_rows)
+    plan, warnings, cartesian = inspect_plan(conn, governed_sql)
+    if cartesian and block_cartesian:
+        raise QueryRejected("Query plan looks like a cartesian product; refusing to run it")
+    return {
+        "sql": governed_sql,
+        "limit_applied": limit_applied,
+        "max_rows": max_rows,
+        "plan": plan,
+        "warnings": warnings
+    }
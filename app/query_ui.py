@@ -1,5 +1,21 @@
+import math
 import streamlit as st
-from utils import get_db_list, run_sql_query, build_semantic_info_dict, build_prompt
+from utils import (
+    get_db_list, get_schema_version, run_sql_query_spilled, build_semantic_info_dict,
+    column_pruning_stats, embed_question
+)
+from prompt_builder import assemble_prompt
+from semantic_cache import lookup_similar, remember, get_semantic_cache_stats
+from answer_cache import (
+    get_cached_sql, put_cached_sql, get_cached_result, put_cached_result, db_content_hash, cache_stats
+)
+from sql_executor import fetch_result_page, PAGE_SIZE
+from result_spill import (
+    new_session_id, new_spill_path, read_spilled_page, estimate_bytes, enforce_session_caps, clear_session,
+    prune_stale_sessions
+)
+from telemetry import trace, span, increment, observe, log_event, snapshot, SIZE_BUCKETS
+import logging
 import requests
 
 
@@ -10,18 +26,63 @@ def call_generate_query_api(api_url, prompt):
         "prompt": prompt
     }
 
-    response = requests.post(endpoint, json=payload, headers=headers)
-    print("Response:\n", response)
+    with span("model_server_call", endpoint="generate_query"):
+        response = requests.post(endpoint, json=payload, headers=headers)
+    increment("model_server_responses_total", endpoint="generate_query", status=response.status_code)
     if response.status_code == 200:
         return response.json()
     else:
         raise Exception(f"API Error {response.status_code}: {response.text}")
 
+def render_timings(timings):
+    st.caption(f"Total: {timings['total_ms']:.1f} ms")
+    st.dataframe([
+        {
+            "Stage": "\u2003" * span_entry["depth"] + span_entry["name"],
+            "ms": round(span_entry["ms"], 2),
+            "Details": ", ".join(f"{k}={v}" for k, v in span_entry["attrs"].items())
+        }
+        for span_entry in timings["spans"]
+    ], use_container_width=True)
+    if timings["values"]:
+        st.write(timings["values"])
+
+def render_result(entry, key):
+    result = entry["result"]
+    if not isinstance(result, dict):
+        st.write(result)
+        return
+
+    governor = result["governor"]
+    if governor["limit_applied"]:
+        st.info(f"🛡️ No LIMIT in the generated SQL; results capped at {governor['max_rows']} rows.")
+    for warning in governor["warnings"]:
+        st.warning(f"🛡️ {warning}")
+
+    total_rows = result["total_rows"]
+    pages = max(1, math.ceil(total_rows / PAGE_SIZE))
+    page = 1
+    if pages > 1:
+        page = st.number_input("Page", min_value=1, max_value=pages, value=1, key=f"result_page_{key}")
+    rows = result["rows"] if page == 1 else None
+    if rows is None:
+        # Evicted preview or a later page: read the spill file, or query again if it is gone.
+        rows = read_spilled_page(result.get("spill"), page - 1)
+    if rows is None:
+        rows = fetch_result_page(entry["db_path"], result["governed_sql"], page - 1)
+
+    start = (page - 1) * PAGE_SIZE
+    st.caption(f"Rows {start + 1 if rows else 0}–{start + len(rows)} of {total_rows}")
+    st.dataframe([dict(zip(result["columns"], row)) for row in rows], use_container_width=True)
+
 def query_interface_page(model_serving_url: str):
     st.title("💬 Natural Language to SQL Chat")
 
     if "chat_history" not in st.session_state:
         st.session_state.chat_history = []
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = new_session_id()
+        prune_stale_sessions()
 
     dbs = get_db_list()
     db_id = st.selectbox("Choose a database", dbs)
@@ -31,30 +92,111 @@ def query_interface_page(model_serving_url: str):
         submitted = st.form_submit_button("Generate SQL")
 
     if submitted and user_input:
-        db_id, db_schema = build_semantic_info_dict(user_input)
-        prompt = build_prompt(user_input, db_id, db_schema)
-        print("Generated Prompt: ", prompt)
-        sql_result = call_generate_query_api(model_serving_url, prompt)['sql_query']
+        with trace("question", db_id=db_id) as question_trace:
+            schema_version = get_schema_version(db_id)
+            cached_sql = get_cached_sql(user_input, db_id, schema_version)
+            increment("answer_cache_lookups_total", layer="question", outcome="hit" if cached_sql else "miss")
+            similar = None
+            pruning = None
+            new_cache_entry = None
+            if not cached_sql:
+                question_embedding = embed_question(user_input)
+                similar = lookup_similar(db_id, question_embedding, schema_version)
+                increment("answer_cache_lookups_total", layer="semantic", outcome="hit" if similar else "miss")
+                if similar:
+                    cached_sql = {"db_id": db_id, "sql": similar["sql"]}
+                    new_cache_entry = cached_sql
+
+            if cached_sql:
+                answer_db_id, sql_result = cached_sql["db_id"], cached_sql["sql"]
+            else:
+                answer_db_id, db_schema = build_semantic_info_dict(
+                    user_input, question_embedding=question_embedding, db_id=db_id
+                )
+                with span("prompt_build"):
+                    assembled = assemble_prompt(user_input, answer_db_id, db_schema, get_schema_version(answer_db_id))
+                    prompt = assembled["prompt"]
+                    pruning = {
+                        **column_pruning_stats(user_input, answer_db_id, db_schema),
+                        "prompt_tokens": assembled["tokens"],
+                        "budget_tables_dropped": assembled["dropped_tables"],
+                        "budget_columns_dropped": assembled["dropped_columns"]
+                    }
+                observe("prompt_tokens", assembled["tokens"], buckets=SIZE_BUCKETS)
+                log_event("prompt", logging.DEBUG, db_id=answer_db_id, prompt=prompt, **pruning)
+                sql_result = call_generate_query_api(model_serving_url, prompt)['sql_query']
+                new_cache_entry = {"db_id": answer_db_id, "sql": sql_result}
 
-        db_path = f"./uploaded_dbs/{db_id}"
-        try:
-            result = run_sql_query(db_path, sql_result)
-        except Exception as e:
-            result = f"❌ Error executing SQL: {e}"
+            db_path = f"./uploaded_dbs/{answer_db_id}"
+            try:
+                db_hash = db_content_hash(db_path)
+                result = get_cached_result(db_hash, sql_result)
+                increment("answer_cache_lookups_total", layer="result", outcome="miss" if result is None else "hit")
+                if result is None:
+                    result = run_sql_query_spilled(db_path, sql_result, new_spill_path(st.session_state.session_id))
+                    put_cached_result(db_hash, sql_result, result)
+                # SQL is only cached once it has run, so failing or rejected SQL is generated afresh next time.
+                if new_cache_entry:
+                    put_cached_sql(user_input, db_id, schema_version, new_cache_entry)
+                if not cached_sql:
+                    remember(answer_db_id, user_input, question_embedding, sql_result, get_schema_version(answer_db_id))
+            except Exception as e:
+                increment("sql_errors_total")
+                result = f"❌ Error executing SQL: {e}"
 
         st.session_state.chat_history.append({
             "question": user_input,
             "sql": sql_result,
-            "result": result
+            "db_path": db_path,
+            # A copy, since evicting its preview must not touch the result cache entry.
+            "result": {**result, "preview_bytes": estimate_bytes(result["rows"])} if isinstance(result, dict) else result,
+            "sql_cached": cached_sql is not None,
+            "similar_question": similar["question"] if similar else None,
+            "pruning": pruning,
+            "timings": {
+                "total_ms": question_trace["total_ms"],
+                "spans": question_trace["spans"],
+                "values": question_trace["values"]
+            }
         })
+        enforce_session_caps(st.session_state.chat_history)
 
     st.subheader("🧠 Conversation History")
-    for i, entry in enumerate(reversed(st.session_state.chat_history)):
+    history = st.session_state.chat_history
+    for i, entry in enumerate(reversed(history)):
         with st.expander(f"Q{i+1}: {entry['question']}"):
-            st.markdown(f"**Generated SQL:**")
+            st.markdown(f"**Generated SQL:**" + (" _(cached)_" if entry.get("sql_cached") else ""))
+            if entry.get("similar_question"):
+                st.caption(f"♻️ Reused SQL from a similar question: {entry['similar_question']}")
+            if entry.get("pruning") and entry["pruning"]["columns_dropped"]:
+                st.caption(
+                    f"✂️ Dropped {entry['pruning']['columns_dropped']} low-relevance columns, "
+                    f"saving ~{entry['pruning']['tokens_saved']} prompt tokens "
+                    f"({entry['pruning']['prompt_tokens']} sent)"
+                )
+            if entry.get("pruning") and (
+                entry["pruning"]["budget_tables_dropped"] or entry["pruning"]["budget_columns_dropped"]
+            ):
+                st.caption(
+                    f"📏 Token budget dropped {entry['pruning']['budget_tables_dropped']} tables and "
+                    f"{entry['pruning']['budget_columns_dropped']} more columns"
+                )
             st.code(entry["sql"])
+            if entry.get("timings"):
+                # Expanders cannot nest, so the breakdown opens in a popover.
+                with st.popover("⏱️ Timing breakdown"):
+                    render_timings(entry["timings"])
             st.markdown(f"**Result:**")
-            st.write(entry["result"])
+            # Only the newest result renders by default; older ones are paged in on request.
+            if i == 0 or st.toggle("Show result", key=f"show_result_{len(history) - 1 - i}"):
+                render_result(entry, len(history) - 1 - i)
+
+    with st.sidebar.expander("🗃️ Answer cache"):
+        st.write({**cache_stats(), "semantic": get_semantic_cache_stats()})
+
+    with st.sidebar.expander("📈 Pipeline metrics"):
+        st.json(snapshot(), expanded=False)
 
     if st.button("🧹 Clear Conversation"):
+        clear_session(st.session_state.session_id)
         st.session_state.chat_history = []
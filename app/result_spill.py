@@ -0,0 +1,255 @@
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+
+from telemetry import increment
+
+SPILL_DIR = os.getenv("RESULT_SPILL_DIR", os.path.join(tempfile.gettempdir(), "nl2sql_results"))
+SPILL_COMPRESSION = os.getenv("RESULT_SPILL_COMPRESSION", "zstd")
+# Per-session caps: result previews held in session state, and spill files on disk.
+SESSION_PREVIEW_MAX_BYTES = int(os.getenv("SESSION_PREVIEW_MAX_MB", "16")) * 1024 * 1024
+SESSION_SPILL_MAX_BYTES = int(os.getenv("SESSION_SPILL_MAX_MB", "512")) * 1024 * 1024
+# Spill directories of sessions that were never cleared are removed after this long.
+SPILL_TTL_SECONDS = float(os.getenv("RESULT_SPILL_TTL_SECONDS", str(24 * 3600)))
+# Child of the variant (dense union) column each Python value type goes to.
+_VARIANT_KINDS = {int: 0, float: 1, str: 2, bytes: 3}
+
+
+def new_session_id():
+    return uuid.uuid4().hex
+
+
+def session_dir(session_id):
+    return os.path.join(SPILL_DIR, session_id)
+
+
+def new_spill_path(session_id):
+    os.makedirs(session_dir(session_id), exist_ok=True)
+    return os.path.join(session_dir(session_id), f"{uuid.uuid4().hex}.arrow")
+
+
+def estimate_bytes(rows):
+    return sum(sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row) for row in rows or [])
+
+
+def spill_supported():
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def _variant_type(pa):
+    # For columns whose values SQLite returns with mixed types; each value
+    # keeps its own type, so it reads back exactly as it was stored.
+    return pa.dense_union([
+        pa.field("int", pa.int64()), pa.field("float", pa.float64()),
+        pa.field("text", pa.string()), pa.field("blob", pa.binary())
+    ])
+
+
+def _variant_array(pa, values):
+    children = ([], [], [], [])
+    type_ids, offsets = [], []
+    for value in values:
+        # NULLs go into the int child as nulls.
+        kind = _VARIANT_KINDS[type(value)] if value is not None else 0
+        type_ids.append(kind)
+        offsets.append(len(children[kind]))
+        children[kind].append(value)
+    variant = _variant_type(pa)
+    return pa.UnionArray.from_dense(
+        pa.array(type_ids, type=pa.int8()), pa.array(offsets, type=pa.int32()),
+        [pa.array(child, type=field.type) for child, field in zip(children, variant)],
+        field_names=[field.name for field in variant]
+    )
+
+
+def _plain_array(pa, values):
+    # None when the values need a variant column. pyarrow only mixes integers
+    # into a float64 array when each of them converts exactly.
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+        return None
+
+
+def _column_array(pa, values, column_type):
+    # values as an array of column_type, or None when the column must widen.
+    if column_type == _variant_type(pa):
+        return _variant_array(pa, values)
+    array = _plain_array(pa, values)
+    if array is None:
+        return None
+    if array.type == column_type:
+        return array
+    if pa.types.is_null(array.type):
+        return pa.nulls(len(array), type=column_type)
+    if pa.types.is_floating(column_type) and pa.types.is_integer(array.type):
+        try:
+            return array.cast(column_type)
+        except pa.ArrowInvalid:
+            return None
+    return None
+
+
+def _widened_type(pa, column_type, values):
+    # NULL-only columns take the first real type, integer columns widen to
+    # float64 for floats, anything else becomes a variant column.
+    array = _plain_array(pa, values)
+    if array is None:
+        return _variant_type(pa)
+    if pa.types.is_null(column_type):
+        return array.type
+    numeric = [pa.types.is_integer(t) or pa.types.is_floating(t) for t in (column_type, array.type)]
+    if all(numeric) and not pa.types.is_floating(column_type):
+        return pa.float64()
+    return _variant_type(pa)
+
+
+def _convert_column(pa, array, column_type):
+    if column_type == _variant_type(pa):
+        return _variant_array(pa, array.to_pylist())
+    return array.cast(column_type)
+
+
+def _rewrite(pa, source_path, target_path, schema, index, column_type, options):
+    # Copies the batches written so far into a new file in which column
+    # `index` has column_type, and returns its still-open writer. Widening a
+    # column to float64 falls back to a variant column if an earlier integer
+    # does not convert exactly.
+    try:
+        schema = schema.set(index, pa.field(schema.field(index).name, column_type))
+        writer = pa.ipc.new_file(target_path, schema, options=options)
+        with pa.memory_map(source_path) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                arrays = batch.columns
+                arrays[index] = _convert_column(pa, arrays[index], column_type)
+                writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+    except pa.ArrowInvalid:
+        writer.close()
+        if column_type == _variant_type(pa):
+            raise
+        return _rewrite(pa, source_path, target_path, schema, index, _variant_type(pa), options)
+    os.remove(source_path)
+    return writer, schema
+
+
+def spill_pages(path, columns, pages):
+    # Streams result pages into an Arrow IPC file, one record batch per page,
+    # so any page can later be read back on its own. Returns the first page
+    # (the in-memory preview), the total row count and the spill file info.
+    # Values are stored exactly as SQLite returned them. A column that turns
+    # out to need a wider type than the pages so far (NULL-only, then typed;
+    # integers, then floats; mixed types) has the file rewritten once with
+    # that type rather than giving up on the spill.
+    import pyarrow as pa
+
+    options = pa.ipc.IpcWriteOptions(compression=SPILL_COMPRESSION or None)
+    preview, total_rows, writer, schema = None, 0, None, None
+    write_path, rewrites = path, 0
+    spilling = True
+    try:
+        for rows in pages:
+            if preview is None:
+                preview = rows
+            total_rows += len(rows)
+            if not spilling:
+                continue
+            try:
+                values = [list(column) for column in zip(*rows)]
+                if schema is None:
+                    types = [
+                        (array.type if array is not None else _variant_type(pa))
+                        for array in (_plain_array(pa, column) for column in values)
+                    ]
+                    schema = pa.schema([pa.field(f"c{i}", t) for i, t in enumerate(types)])
+                    writer = pa.ipc.new_file(write_path, schema, options=options)
+                arrays = []
+                for i, column in enumerate(values):
+                    array = _column_array(pa, column, schema.field(i).type)
+                    while array is None:
+                        increment("result_spill_rewrites_total")
+                        column_type = _widened_type(pa, schema.field(i).type, column)
+                        writer.close()
+                        rewrites += 1
+                        source_path, write_path = write_path, f"{path}.{rewrites}"
+                        writer, schema = _rewrite(pa, source_path, write_path, schema, i, column_type, options)
+                        array = _column_array(pa, column, schema.field(i).type)
+                    arrays.append(array)
+                writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+            except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+                # Should not happen with variant columns; keep counting rows
+                # and let later pages be queried again.
+                increment("result_spill_failures_total")
+                spilling = False
+                if writer is not None:
+                    writer.close()
+                    writer = None
+                if os.path.exists(write_path):
+                    os.remove(write_path)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    spill = None
+    if writer is not None:
+        if write_path != path:
+            os.replace(write_path, path)
+        spill = {"path": path, "bytes": os.path.getsize(path)}
+    return preview or [], total_rows, spill
+
+
+def read_spilled_page(spill, page):
+    # None when the spill file is gone (evicted or cleared); callers re-run the query.
+    if not spill or not os.path.exists(spill["path"]):
+        return None
+    import pyarrow as pa
+    with pa.memory_map(spill["path"]) as source:
+        reader = pa.ipc.open_file(source)
+        if page >= reader.num_record_batches:
+            return []
+        batch = reader.get_batch(page)
+        return list(zip(*(column.to_pylist() for column in batch.columns)))
+
+
+def enforce_session_caps(history, preview_max_bytes=SESSION_PREVIEW_MAX_BYTES, spill_max_bytes=SESSION_SPILL_MAX_BYTES):
+    # Oldest entries go first and the newest is never touched: previews are
+    # dropped (pages then come from the spill file), then spill files (pages
+    # are queried again).
+    results = [entry["result"] for entry in history if isinstance(entry["result"], dict)]
+    preview_bytes = sum(r["preview_bytes"] for r in results if r["rows"] is not None)
+    spill_bytes = sum(r["spill"]["bytes"] for r in results if r.get("spill"))
+    for result in results[:-1]:
+        if preview_bytes > preview_max_bytes and result["rows"] is not None:
+            preview_bytes -= result["preview_bytes"]
+            result["rows"] = None
+            increment("result_evictions_total", kind="preview")
+        if spill_bytes > spill_max_bytes and result.get("spill"):
+            spill_bytes -= result["spill"]["bytes"]
+            if os.path.exists(result["spill"]["path"]):
+                os.remove(result["spill"]["path"])
+            result["spill"] = None
+            increment("result_evictions_total", kind="spill")
+    return {"preview_bytes": preview_bytes, "spill_bytes": spill_bytes}
+
+
+def clear_session(session_id):
+    if session_id:
+        shutil.rmtree(session_dir(session_id), ignore_errors=True)
+
+
+def prune_stale_sessions(ttl_seconds=SPILL_TTL_SECONDS):
+    if not os.path.isdir(SPILL_DIR):
+        return 0
+    cutoff = time.time() - ttl_seconds
+    removed = 0
+    for entry in os.listdir(SPILL_DIR):
+        path = os.path.join(SPILL_DIR, entry)
+        if os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    return removed
@@ -0,0 +1,72 @@
+from sql_executor import pooled_connection
+
+ROW_COUNT_CAP = 1_000_000
+SAMPLE_SCAN_ROWS = 1000
+DISTINCT_SAMPLES = 5
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _bounded_row_count(conn, table_name, cap):
+    # Counting stops after `cap` rows so huge tables never cost a full scan.
+    return conn.execute(
+        f"SELECT COUNT(*) FROM (SELECT 1 FROM {_quote(table_name)} LIMIT ?)", (cap,)
+    ).fetchone()[0]
+
+
+def _distinct_samples(conn, table_name, column_name, scan_rows, samples):
+    column = _quote(column_name)
+    rows = conn.execute(f"""
+        SELECT DISTINCT {column}
+        FROM (SELECT {column} FROM {_quote(table_name)} LIMIT ?)
+        WHERE {column} IS NOT NULL
+        LIMIT ?
+    """, (scan_rows, samples)).fetchall()
+    return [row[0] if isinstance(row[0], (int, float)) else str(row[0])[:100] for row in rows]
+
+
+def introspect_sqlite(db_path, with_stats=True, row_count_cap=ROW_COUNT_CAP,
+                      sample_scan_rows=SAMPLE_SCAN_ROWS, distinct_samples=DISTINCT_SAMPLES):
+    tables = []
+    with pooled_connection(db_path) as conn:
+        table_names = [
+            row[0] for row in conn.execute("""
+                SELECT name FROM sqlite_master
+                WHERE type = 'table' AND name NOT LIKE 'sqlite_%'
+                ORDER BY rowid
+            """)
+        ]
+        for table_name in table_names:
+            info = conn.execute(f"PRAGMA table_info({_quote(table_name)})").fetchall()
+            # table_info rows: (cid, name, type, notnull, dflt_value, pk)
+            columns = [row[1] for row in info]
+            primary_keys = [row[1] for row in sorted(info, key=lambda r: r[5]) if row[5]]
+
+            foreign_keys = {}
+            # foreign_key_list rows: (id, seq, table, from, to, on_update, on_delete, match)
+            for fk_id, _, ref_table, from_col, to_col, *_ in conn.execute(
+                f"PRAGMA foreign_key_list({_quote(table_name)})"
+            ):
+                fk = foreign_keys.setdefault(fk_id, {"columns": [], "ref_table": ref_table, "ref_columns": []})
+                fk["columns"].append(from_col)
+                fk["ref_columns"].append(to_col)
+
+            table = {
+                "table_name": table_name,
+                "columns": columns,
+                "data_types": [row[2] for row in info],
+                "primary_keys": primary_keys,
+                "foreign_keys": list(foreign_keys.values()),
+                "row_count": None,
+                "column_samples": {}
+            }
+            if with_stats:
+                table["row_count"] = _bounded_row_count(conn, table_name, row_count_cap)
+                table["column_samples"] = {
+                    col: _distinct_samples(conn, table_name, col, sample_scan_rows, distinct_samples)
+                    for col in columns
+                }
+            tables.append(table)
+    return tables
@@ -0,0 +1,144 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+from metadata_store import get_connection
+from embedding_index import EMBEDDING_DTYPE
+
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_MAX_PER_DB = int(os.getenv("SEMANTIC_CACHE_MAX_PER_DB", "500"))
+
+_lock = threading.Lock()
+_matrices = {}
+_stats = {"hits": 0, "misses": 0}
+
+
+def init_semantic_cache(metadata_db="metadata_store.db"):
+    conn = get_connection(metadata_db)
+    with conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS semantic_cache (
+                entry_id INTEGER PRIMARY KEY,
+                db_id TEXT NOT NULL,
+                schema_version INTEGER NOT NULL,
+                question TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                sql TEXT NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                last_used REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_semantic_cache_db ON semantic_cache (db_id, schema_version)")
+
+
+def _load(db_id, schema_version, metadata_db):
+    key = (os.path.abspath(metadata_db), db_id, schema_version)
+    with _lock:
+        cached = _matrices.get(key)
+    if cached is not None:
+        return cached
+
+    rows = get_connection(metadata_db).execute("""
+        SELECT entry_id, question, sql, embedding
+        FROM semantic_cache
+        WHERE db_id = ? AND schema_version = ?
+    """, (db_id, schema_version)).fetchall()
+    entries = {
+        "ids": [row[0] for row in rows],
+        "questions": [row[1] for row in rows],
+        "sql": [row[2] for row in rows],
+        "matrix": (
+            np.vstack([np.frombuffer(row[3], dtype=EMBEDDING_DTYPE) for row in rows])
+            if rows else None
+        )
+    }
+    with _lock:
+        _matrices[key] = entries
+    return entries
+
+
+def _drop(db_id, metadata_db):
+    prefix = (os.path.abspath(metadata_db), db_id)
+    with _lock:
+        for key in [key for key in _matrices if key[:2] == prefix]:
+            del _matrices[key]
+
+
+def lookup_similar(db_id, embedding, schema_version, threshold=SEMANTIC_CACHE_THRESHOLD,
+                   metadata_db="metadata_store.db"):
+    # embedding must be L2-normalized, as produced by embeddings.encode.
+    entries = _load(db_id, schema_version, metadata_db)
+    if entries["matrix"] is None:
+        with _lock:
+            _stats["misses"] += 1
+        return None
+
+    scores = entries["matrix"] @ np.asarray(embedding, dtype=EMBEDDING_DTYPE)
+    best = int(np.argmax(scores))
+    if scores[best] < threshold:
+        with _lock:
+            _stats["misses"] += 1
+        return None
+
+    conn = get_connection(metadata_db)
+    with conn:
+        conn.execute(
+            "UPDATE semantic_cache SET hits = hits + 1, last_used = ? WHERE entry_id = ?",
+            (time.time(), entries["ids"][best])
+        )
+    with _lock:
+        _stats["hits"] += 1
+    return {"score": float(scores[best]), "question": entries["questions"][best], "sql": entries["sql"][best]}
+
+
+def remember(db_id, question, embedding, sql, schema_version, max_entries=SEMANTIC_CACHE_MAX_PER_DB,
+             metadata_db="metadata_store.db"):
+    conn = get_connection(metadata_db)
+    with conn:
+        conn.execute("""
+            INSERT INTO semantic_cache (db_id, schema_version, question, embedding, sql, last_used)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (
+            db_id,
+            schema_version,
+            question,
+            np.ascontiguousarray(embedding, dtype=EMBEDDING_DTYPE).tobytes(),
+            sql,
+            time.time()
+        ))
+        # Entries for older schema versions can never match again.
+        conn.execute(
+            "DELETE FROM semantic_cache WHERE db_id = ? AND schema_version != ?",
+            (db_id, schema_version)
+        )
+        conn.execute("""
+            DELETE FROM semantic_cache
+            WHERE entry_id IN (
+                SELECT entry_id FROM semantic_cache
+                WHERE db_id = ?
+                ORDER BY last_used DESC
+                LIMIT -1 OFFSET ?
+            )
+        """, (db_id, max_entries))
+    _drop(db_id, metadata_db)
+
+
+def invalidate_semantic_cache(db_id=None, metadata_db="metadata_store.db"):
+    conn = get_connection(metadata_db)
+    with conn:
+        if db_id is None:
+            conn.execute("DELETE FROM semantic_cache")
+        else:
+            conn.execute("DELETE FROM semantic_cache WHERE db_id = ?", (db_id,))
+    with _lock:
+        _matrices.clear()
+
+
+def get_semantic_cache_stats():
+    with _lock:
+        stats = dict(_stats)
+    total = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / total if total else 0.0
+    return stats
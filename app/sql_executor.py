@@ -0,0 +1,182 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from query_governor import (
+    QueryRejected, govern, make_progress_handler, MAX_ROWS, TIME_BUDGET_SECONDS, PROGRESS_INTERVAL
+)
+
+POOL_SIZE = 4
+PAGE_SIZE = 100
+CACHE_SIZE_KB = 64 * 1024
+MMAP_SIZE = 256 * 1024 * 1024
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _open_readonly(db_path):
+    uri = f"file:{os.path.abspath(db_path)}?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    conn.execute("PRAGMA query_only=ON")
+    return conn
+
+
+class ConnectionPool:
+    def __init__(self, db_path, size=POOL_SIZE):
+        self.db_path = db_path
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._slots = threading.BoundedSemaphore(size)
+
+    def acquire(self):
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            try:
+                return _open_readonly(self.db_path)
+            except Exception:
+                self._slots.release()
+                raise
+
+    def release(self, conn):
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+        self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def get_pool(db_path):
+    key = os.path.abspath(db_path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(db_path)
+        return pool
+
+
+def close_pool(db_path):
+    # Call before the underlying file is replaced so no stale handles survive.
+    with _pools_lock:
+        pool = _pools.pop(os.path.abspath(db_path), None)
+    if pool:
+        pool.close()
+
+
+@contextmanager
+def pooled_connection(db_path):
+    pool = get_pool(db_path)
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        conn.rollback()
+        pool.release(conn)
+
+
+def _strip_sql(sql):
+    return sql.strip().rstrip(";").strip()
+
+
+@contextmanager
+def _budgeted(conn):
+    handler, state = make_progress_handler()
+    conn.set_progress_handler(handler, PROGRESS_INTERVAL)
+    try:
+        yield
+    except sqlite3.OperationalError as e:
+        if state["reason"]:
+            raise QueryRejected(f"Query interrupted: {state['reason']}") from e
+        raise
+    finally:
+        conn.set_progress_handler(None, 0)
+
+
+class QueryResult:
+    # Cursor-backed result; rows are pulled lazily with fetchmany and the
+    # connection goes back to the pool on close(). Every statement goes
+    # through the query governor first.
+    def __init__(self, db_path, sql, max_rows=MAX_ROWS, time_budget=TIME_BUDGET_SECONDS):
+        self.db_path = db_path
+        self._pool = get_pool(db_path)
+        self._conn = self._pool.acquire()
+        try:
+            self.governor = govern(self._conn, sql, max_rows)
+            self.sql = self.governor["sql"]
+            self._handler, self._state = make_progress_handler(time_budget)
+            self._conn.set_progress_handler(self._handler, PROGRESS_INTERVAL)
+            self._cursor = self._run(self._conn.execute, self.sql)
+        except Exception:
+            self.close()
+            raise
+        self.columns = [d[0] for d in self._cursor.description or []]
+        self._total_rows = None
+
+    def _run(self, fn, *args):
+        try:
+            return fn(*args)
+        except sqlite3.OperationalError as e:
+            if self._state["reason"]:
+                raise QueryRejected(f"Query interrupted: {self._state['reason']}") from e
+            raise
+
+    def fetch_page(self, page_size=PAGE_SIZE):
+        return self._run(self._cursor.fetchmany, page_size)
+
+    def __iter__(self):
+        while True:
+            rows = self.fetch_page()
+            if not rows:
+                return
+            yield from rows
+
+    def fetchall(self):
+        return list(self)
+
+    def total_rows(self):
+        if self._total_rows is None:
+            # Counting inside SQLite never materializes the rows in Python.
+            cursor = self._run(self._conn.execute, f"SELECT COUNT(*) FROM ({self.sql})")
+            self._total_rows = self._run(cursor.fetchone)[0]
+        return self._total_rows
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.set_progress_handler(None, 0)
+            self._conn.rollback()
+            self._pool.release(self._conn)
+            self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def execute_query(db_path, sql, max_rows=MAX_ROWS, time_budget=TIME_BUDGET_SECONDS):
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"No uploaded database at {db_path}")
+    return QueryResult(db_path, sql, max_rows, time_budget)
+
+
+def fetch_result_page(db_path, sql, page, page_size=PAGE_SIZE):
+    # sql should be the governed statement from QueryResult.sql.
+    with pooled_connection(db_path) as conn, _budgeted(conn):
+        cursor = conn.execute(
+            f"SELECT * FROM ({_strip_sql(sql)}) LIMIT ? OFFSET ?",
+            (page_size, page * page_size)
+        )
+        return cursor.fetchall()
@@ -0,0 +1,204 @@
+import bisect
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRIC_PREFIX = "nl2sql"
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 100000)
+
+logger = logging.getLogger("nl2sql")
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_current_trace = contextvars.ContextVar("nl2sql_trace", default=None)
+# Nesting depth lives in the context rather than the trace, so spans opened in
+# worker threads (each running in a copy of the caller's context) nest under
+# the span that started them instead of under each other.
+_span_depth = contextvars.ContextVar("nl2sql_span_depth", default=0)
+_metrics_server = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        event = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        event.update(getattr(record, "fields", {}))
+        return json.dumps(event, default=str)
+
+
+def configure_logging(level=None):
+    # JSON lines on stderr; LOG_LEVEL=DEBUG also logs full prompts.
+    if any(isinstance(h.formatter, JsonFormatter) for h in logger.handlers):
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter())
+    logger.addHandler(handler)
+    logger.setLevel(level or os.getenv("LOG_LEVEL", "INFO"))
+    logger.propagate = False
+
+
+def log_event(message, level=logging.INFO, **fields):
+    logger.log(level, message, extra={"fields": fields})
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def increment(name, value=1, **labels):
+    with _lock:
+        key = _key(name, labels)
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def _observe(name, value, buckets, labels):
+    with _lock:
+        key = _key(name, labels)
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {"buckets": buckets, "counts": [0] * len(buckets), "count": 0, "sum": 0.0}
+        index = bisect.bisect_left(histogram["buckets"], value)
+        if index < len(histogram["buckets"]):
+            histogram["counts"][index] += 1
+        histogram["count"] += 1
+        histogram["sum"] += value
+
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    _observe(name, value, buckets, labels)
+    trace = _current_trace.get()
+    if trace is not None:
+        with _lock:
+            trace["values"][name] = value
+
+
+@contextmanager
+def trace(name, **attrs):
+    # Collects every span and size observation made in this context, e.g. for
+    # one question; the yielded dict is filled in as the work runs.
+    collected = {"name": name, "attrs": attrs, "spans": [], "values": {}}
+    token = _current_trace.set(collected)
+    depth_token = _span_depth.set(0)
+    start = time.perf_counter()
+    try:
+        yield collected
+    finally:
+        collected["total_ms"] = (time.perf_counter() - start) * 1000
+        _span_depth.reset(depth_token)
+        _current_trace.reset(token)
+        log_event("trace", trace=name, total_ms=round(collected["total_ms"], 2), **attrs,
+                  spans={s["name"]: round(s["ms"], 2) for s in collected["spans"]}, values=collected["values"])
+
+
+@contextmanager
+def span(name, **attrs):
+    trace = _current_trace.get()
+    depth = _span_depth.get()
+    entry = {"name": name, "attrs": attrs, "depth": depth}
+    if trace is not None:
+        with _lock:
+            trace["spans"].append(entry)
+    depth_token = _span_depth.set(depth + 1)
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield entry
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        entry["ms"] = elapsed * 1000
+        entry["status"] = status
+        _span_depth.reset(depth_token)
+        _observe("span_seconds", elapsed, LATENCY_BUCKETS, {"span": name})
+        if status == "error":
+            increment("span_errors_total", span=name)
+        log_event("span", logging.DEBUG, span=name, ms=round(entry["ms"], 2), status=status, **entry["attrs"])
+
+
+def snapshot():
+    with _lock:
+        return {
+            "counters": [{"name": name, "labels": dict(labels), "value": value}
+                         for (name, labels), value in sorted(_counters.items())],
+            "histograms": [{"name": name, "labels": dict(labels), "count": h["count"], "sum": h["sum"],
+                            "buckets": dict(zip(map(str, h["buckets"]), h["counts"]))}
+                           for (name, labels), h in sorted(_histograms.items())]
+        }
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def render_prometheus():
+    lines = []
+    with _lock:
+        for name in sorted({name for name, _ in _counters}):
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} counter")
+            for (metric, labels), value in sorted(_counters.items()):
+                if metric == name:
+                    lines.append(f"{METRIC_PREFIX}_{name}{_labels(labels)} {value}")
+        for name in sorted({name for name, _ in _histograms}):
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} histogram")
+            for (metric, labels), h in sorted(_histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(h["buckets"], h["counts"]):
+                    cumulative += count
+                    lines.append(f"{METRIC_PREFIX}_{name}_bucket{_labels(labels, le=bound)} {cumulative}")
+                lines.append(f"{METRIC_PREFIX}_{name}_bucket{_labels(labels, le='+Inf')} {h['count']}")
+                lines.append(f"{METRIC_PREFIX}_{name}_sum{_labels(labels)} {h['sum']}")
+                lines.append(f"{METRIC_PREFIX}_{name}_count{_labels(labels)} {h['count']}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = render_prometheus(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, content_type = json.dumps(snapshot()), "application/json"
+        else:
+            self.send_error(404)
+            return
+        body = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port, host="0.0.0.0"):
+    # Serves /metrics (Prometheus text) and /metrics.json; one server per process.
+    global _metrics_server
+    with _lock:
+        if _metrics_server is None:
+            _metrics_server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            _metrics_server.daemon_threads = True
+            threading.Thread(target=_metrics_server.serve_forever, daemon=True).start()
+    return _metrics_server
@@ -0,0 +1,144 @@
+import hashlib
+import os
+import sqlite3
+import tempfile
+
+UPLOAD_DIR = "uploaded_dbs"
+BLOB_DIR_NAME = "blobs"
+COPY_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+class IntegrityCheckFailed(Exception):
+    pass
+
+
+def _blob_dir(upload_dir):
+    return os.path.join(upload_dir, BLOB_DIR_NAME)
+
+
+def quick_check(db_path):
+    # PRAGMA quick_check returns a single "ok" row for a healthy database.
+    try:
+        conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+        try:
+            rows = conn.execute("PRAGMA quick_check").fetchall()
+        finally:
+            conn.close()
+    except sqlite3.DatabaseError as e:
+        return [str(e)]
+    return [] if rows == [("ok",)] else [row[0] for row in rows]
+
+
+def _hash_sidecar(db_path):
+    return db_path + ".sha256"
+
+
+def stored_content_hash(db_path):
+    # Names under upload_dir link to blobs/<sha256>.db, so the hash of a stored
+    # upload is known without reading the file. A hard link (the fallback when
+    # symlinks are unavailable) has its hash in a <name>.sha256 sidecar, which
+    # only counts while the name is still the same file as that blob.
+    if os.path.islink(db_path):
+        target = os.path.realpath(db_path)
+        if os.path.basename(os.path.dirname(target)) != BLOB_DIR_NAME:
+            return None
+        return os.path.splitext(os.path.basename(target))[0]
+    try:
+        with open(_hash_sidecar(db_path)) as f:
+            content_hash = f.read().strip()
+        blob_path = os.path.join(_blob_dir(os.path.dirname(db_path)), f"{content_hash}.db")
+        return content_hash if os.path.samefile(db_path, blob_path) else None
+    except OSError:
+        return None
+
+
+def _point_name_at(db_path, blob_path):
+    tmp_link = db_path + ".tmp-link"
+    if os.path.lexists(tmp_link):
+        os.remove(tmp_link)
+    try:
+        os.symlink(os.path.relpath(blob_path, os.path.dirname(db_path)), tmp_link)
+        hard_link = False
+    except OSError:
+        # No symlink support (e.g. Windows without developer mode).
+        os.link(blob_path, tmp_link)
+        hard_link = True
+    os.replace(tmp_link, db_path)
+    sidecar = _hash_sidecar(db_path)
+    if hard_link:
+        with open(sidecar + ".tmp", "w") as f:
+            f.write(os.path.splitext(os.path.basename(blob_path))[0])
+        os.replace(sidecar + ".tmp", sidecar)
+    elif os.path.exists(sidecar):
+        os.remove(sidecar)
+
+
+def store_upload(file_obj, name, upload_dir=UPLOAD_DIR, chunk_size=COPY_CHUNK_SIZE):
+    # Streams file_obj to disk in chunks while hashing it, keeps one copy per
+    # distinct content under blobs/ and points upload_dir/<name> at it. Only
+    # content not seen before is integrity-checked.
+    blob_dir = _blob_dir(upload_dir)
+    os.makedirs(blob_dir, exist_ok=True)
+    db_path = os.path.join(upload_dir, name)
+    previous_hash = stored_content_hash(db_path)
+
+    digest = hashlib.sha256()
+    size = 0
+    file_obj.seek(0)
+    fd, tmp_path = tempfile.mkstemp(dir=blob_dir, suffix=".upload")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for chunk in iter(lambda: file_obj.read(chunk_size), b""):
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+        content_hash = digest.hexdigest()
+        blob_path = os.path.join(blob_dir, f"{content_hash}.db")
+        is_new = not os.path.exists(blob_path)
+        if is_new:
+            problems = quick_check(tmp_path)
+            if problems:
+                raise IntegrityCheckFailed(f"{name} failed PRAGMA quick_check: {'; '.join(problems[:5])}")
+            os.replace(tmp_path, blob_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    changed = previous_hash != content_hash
+    return {
+        "db_path": db_path,
+        "blob_path": blob_path,
+        "content_hash": content_hash,
+        "previous_hash": previous_hash,
+        "size": size,
+        "is_new": is_new,
+        "changed": changed
+    }
+
+
+def activate_upload(stored):
+    # Separate from store_upload so callers can release handles on the old
+    # file before the name is switched over.
+    if stored["changed"]:
+        _point_name_at(stored["db_path"], stored["blob_path"])
+
+
+def prune_blobs(upload_dir=UPLOAD_DIR):
+    # Deletes blobs that no name under upload_dir points to any more.
+    blob_dir = _blob_dir(upload_dir)
+    if not os.path.isdir(blob_dir):
+        return 0
+    referenced = {
+        stored_content_hash(os.path.join(upload_dir, entry))
+        for entry in os.listdir(upload_dir)
+    }
+    removed = 0
+    for entry in os.listdir(blob_dir):
+        content_hash, ext = os.path.splitext(entry)
+        if ext == ".db" and content_hash not in referenced:
+            try:
+                os.remove(os.path.join(blob_dir, entry))
+                removed += 1
+            except OSError:
+                pass
+    return removed
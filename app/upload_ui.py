@@ -2,67 +2,173 @@ import streamlit as st
 import os
 from collections import defaultdict
 
-from ddl_parser import extract_schema_metadata
-from utils import init_metadata_db, insert_metadata
-from intent_infer import call_generate_intents_api
+from ddl_parser import iter_create_tables
+from schema_introspect import introspect_sqlite
+from utils import insert_metadata, diff_schema
+from intent_infer import iter_generate_intents, purge_stale_intents
+from intent_cache import get_intent_cache_stats
+from sql_executor import close_pool
+from answer_cache import invalidate_db
+from upload_store import store_upload, activate_upload, prune_blobs, IntegrityCheckFailed, UPLOAD_DIR
+from telemetry import trace, span
+
+SCHEMA_SOURCES = {
+    "introspect": "🔍 Read schema from the SQLite file",
+    "ddl": "📜 Parse the matching DDL file"
+}
+
+
+def load_tables(entry, schema_source):
+    if schema_source == "ddl":
+        if not entry["ddl_contents"]:
+            st.warning(f"⚠️ No DDL named like {entry['db_name']}; reading the schema from the SQLite file instead")
+        else:
+            return [
+                {**table, "row_count": None, "column_samples": {}}
+                for table in iter_create_tables(entry["ddl_contents"])
+            ]
+    return introspect_sqlite(entry["db_path"])
+
+
+def metadata_rows(db_id, table, response):
+    table_intent = response.get('table_intent')
+    column_intents = response.get('column_intents')
+    references = {}
+    for fk in table["foreign_keys"]:
+        for col, ref_col in zip(fk["columns"], fk["ref_columns"] or [None] * len(fk["columns"])):
+            references[col] = (fk["ref_table"], ref_col)
+
+    return [
+        {
+            "db_id": db_id,
+            "table_name": table["table_name"],
+            "column_name": col,
+            "data_type": dtype,
+            "table_intent": table_intent,
+            "column_intent": column_intents.get(col, ""),
+            "is_primary_key": col in table["primary_keys"],
+            "ref_table": references.get(col, (None, None))[0],
+            "ref_column": references.get(col, (None, None))[1],
+            "sample_values": table["column_samples"].get(col),
+            "row_count": table["row_count"]
+        }
+        for col, dtype in zip(table["columns"], table["data_types"])
+    ]
+
 
 def upload_schema_page(model_serving_url: str):
-    st.title("📄 Upload DDL + SQLite DB")
-    init_metadata_db()
+    st.title("📄 Upload SQLite DB (+ optional DDL)")
+    if "intent_cache_purged" not in st.session_state:
+        purge_stale_intents()
+        st.session_state.intent_cache_purged = True
 
     if "uploads" not in st.session_state:
         st.session_state.uploads = []
+    if "stored_uploads" not in st.session_state:
+        # file_id -> store_upload() result, so reruns don't copy the same upload again.
+        st.session_state.stored_uploads = {}
 
-    uploaded_ddls = st.file_uploader("Upload DDL Files (.sql)", type=["sql"], accept_multiple_files=True)
     uploaded_dbs = st.file_uploader("Upload SQLite DBs (.db)", type=["db"], accept_multiple_files=True)
+    uploaded_ddls = st.file_uploader(
+        "Optional: DDL files (.sql), matched to databases by file name",
+        type=["sql"], accept_multiple_files=True
+    )
+    schema_source = st.radio(
+        "Schema source", list(SCHEMA_SOURCES), format_func=SCHEMA_SOURCES.get, horizontal=True
+    )
 
-    if uploaded_ddls and uploaded_dbs:
-        os.makedirs("uploaded_dbs", exist_ok=True)
-        for ddl_file, db_file in zip(uploaded_ddls, uploaded_dbs):
-            ddl_contents = ddl_file.read().decode("utf-8")
-            db_path = os.path.join("uploaded_dbs", db_file.name)
-
-            with open(db_path, "wb") as f:
-                f.write(db_file.read())
-            st.session_state.uploads = []
-            st.session_state.uploads.append({
-                "ddl_name": ddl_file.name,
+    if uploaded_dbs:
+        ddls_by_stem = {os.path.splitext(f.name)[0]: f for f in uploaded_ddls or []}
+        uploads = []
+        replaced = False
+        for db_file in uploaded_dbs:
+            ddl_file = ddls_by_stem.get(os.path.splitext(db_file.name)[0])
+            stored = st.session_state.stored_uploads.get(db_file.file_id)
+            if stored is None:
+                try:
+                    with span("upload_store", db_id=db_file.name, bytes=db_file.size):
+                        stored = store_upload(db_file, db_file.name)
+                except IntegrityCheckFailed as e:
+                    st.error(f"❌ {e}")
+                    continue
+                if stored["changed"]:
+                    close_pool(stored["db_path"])
+                    invalidate_db(db_file.name, stored["db_path"])
+                    activate_upload(stored)
+                    replaced = True
+                st.session_state.stored_uploads[db_file.file_id] = stored
+                st.caption(
+                    f"💾 {db_file.name}: sha256 {stored['content_hash'][:12]}, "
+                    + ("new content, integrity check passed" if stored["is_new"] else "identical content already stored")
+                )
+            uploads.append({
+                "ddl_name": ddl_file.name if ddl_file else None,
                 "db_name": db_file.name,
-                "ddl_contents": ddl_contents,
-                "db_path": db_path
+                "ddl_contents": ddl_file.getvalue().decode("utf-8") if ddl_file else None,
+                "db_path": stored["db_path"],
+                "content_hash": stored["content_hash"]
             })
+        st.session_state.uploads = uploads
+        if replaced:
+            prune_blobs(UPLOAD_DIR)
 
-        st.success("✅ Files uploaded. You can now infer intents.")
+        if uploads:
+            st.success("✅ Files uploaded. You can now infer intents.")
 
     if st.button("🧠 Run Intent Inference"):
         all_metadata = []
 
         for entry in st.session_state.uploads:
-            st.write(f"📂 Processing: {entry['ddl_name']} + {entry['db_name']}")
-            parsed_metadata = extract_schema_metadata(entry["ddl_contents"])
-            if not parsed_metadata:
-                st.warning(f"⚠️ No tables found in {entry['ddl_name']}")
-                continue
-
-            parsed_metadata_with_intent = []
-            with st.spinner("Inferring intents..."):
-                for table_name, columns, data_types in parsed_metadata:
-                    response = call_generate_intents_api(model_serving_url, table_name, columns, data_types)
-                    table_intent = response.get('table_intent')
-                    column_intents = response.get('column_intents')
-
-                    for col, dtype in zip(columns, data_types):
-                        parsed_metadata_with_intent.append({
-                            "db_id": entry["db_name"],
-                            "table_name": table_name,
-                            "column_name": col,
-                            "data_type": dtype,
-                            "table_intent": table_intent,
-                            "column_intent": column_intents.get(col, "")
-                        })
-
-            insert_metadata(parsed_metadata_with_intent)
-            all_metadata.extend(parsed_metadata_with_intent)
+            with trace("upload", db_id=entry["db_name"]) as upload_trace:
+                st.write(f"📂 Processing: {entry['db_name']}" + (f" + {entry['ddl_name']}" if entry["ddl_name"] else ""))
+                with span("schema_load", source=schema_source):
+                    tables = load_tables(entry, schema_source)
+                if not tables:
+                    st.warning(f"⚠️ No tables found for {entry['db_name']}")
+                    continue
+                parsed_metadata = [[t["table_name"], t["columns"], t["data_types"]] for t in tables]
+
+                with span("schema_diff"):
+                    report = diff_schema(entry["db_name"], parsed_metadata)
+                st.write(
+                    f"➕ {len(report['added'])} added, ✏️ {len(report['changed'])} changed, "
+                    f"➖ {len(report['removed'])} removed, ✅ {len(report['unchanged'])} unchanged"
+                )
+                with st.expander("Schema changes"):
+                    st.json(report)
+
+                to_infer = set(report["added"]) | set(report["changed"])
+                tables = [table for table in tables if table["table_name"] in to_infer]
+                parsed_metadata = [table for table in parsed_metadata if table[0] in to_infer]
+
+                parsed_metadata_with_intent = []
+                progress = st.progress(0.0, text=f"Inferring intents for {len(parsed_metadata)} tables...")
+                responses = [None] * len(parsed_metadata)
+                with span("intent_inference", tables=len(parsed_metadata)):
+                    for done, (index, response) in enumerate(
+                        iter_generate_intents(model_serving_url, parsed_metadata), start=1
+                    ):
+                        responses[index] = response
+                        progress.progress(
+                            done / len(parsed_metadata),
+                            text=f"Inferred {done}/{len(parsed_metadata)}: {parsed_metadata[index][0]}"
+                        )
+
+                for table, response in zip(tables, responses):
+                    parsed_metadata_with_intent.extend(metadata_rows(entry["db_name"], table, response))
+
+                insert_metadata(
+                    parsed_metadata_with_intent,
+                    removed_tables=[(entry["db_name"], table_name) for table_name in report["removed"]]
+                )
+                invalidate_db(entry["db_name"])
+                all_metadata.extend(parsed_metadata_with_intent)
+            st.caption("⏱️ " + ", ".join(
+                f"{s['name']} {s['ms']:.0f} ms" for s in upload_trace["spans"] if s["depth"] == 0
+            ) + f" (total {upload_trace['total_ms']:.0f} ms)")
+
+        stats = get_intent_cache_stats()
+        st.caption(f"🗃️ Intent cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate)")
 
         st.subheader("📊 Extracted Metadata + Intents")
         grouped = defaultdict(list)
@@ -1,169 +1,273 @@
-from sentence_transformers import SentenceTransformer, util
-import sqlite3
 import os
 
+import numpy as np
+
+from embeddings import encode, EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND
+from metadata_store import get_connection, init_schema, replace_tables, fetch_schema_rows, get_schema_version
+from sql_executor import execute_query, PAGE_SIZE
+from query_governor import MAX_ROWS
+from semantic_cache import init_semantic_cache, invalidate_semantic_cache
+from prompt_builder import build_prompt as _build_prompt, count_tokens, invalidate_table_blocks
+from answer_cache import invalidate_db
+from telemetry import span, observe, SIZE_BUCKETS
+from result_spill import spill_pages, spill_supported
+from embedding_index import (
+    init_embedding_index, sync_encoder, upsert_table_embeddings, delete_table_embeddings, get_missing_tables,
+    search_tables, upsert_column_embeddings, delete_column_embeddings, get_missing_columns, load_column_embeddings,
+    EMBEDDING_DTYPE
+)
+
 DB_PATH = os.path.join(os.getcwd(), "metadata_store.db")
+# Columns kept per table (besides key and join columns); 0 keeps every column.
+COLUMN_TOP_K = int(os.getenv("COLUMN_TOP_K", "15"))
 
 
-def run_sql_query(db_path, sql):
+def run_sql_query(db_path, sql, max_rows=MAX_ROWS):
     try:
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute(sql)
-        result = cursor.fetchall()
-        conn.close()
-        return result
+        with span("sql_execution"), execute_query(db_path, sql, max_rows) as result:
+            rows = result.fetchall()
+            observe("rows_returned", len(rows), buckets=SIZE_BUCKETS)
+            return rows
     except Exception as e:
         raise RuntimeError(f"Error executing SQL on {db_path}:\n{sql}\n{e}")
 
-def init_metadata_db():
-    if os.path.exists("metadata_store.db"):
-        return
-    conn = sqlite3.connect("metadata_store.db")
-    cursor = conn.cursor()
-    cursor.execute("DROP TABLE IF EXISTS metadata")
-    cursor.execute("""
-        CREATE TABLE metadata (
-            db_id TEXT,
-            table_name TEXT,
-            column_name TEXT,
-            data_type TEXT,
-            table_intent TEXT,
-            column_intent TEXT
-        )
-    """)
-    conn.commit()
-    conn.close()
+def run_sql_query_spilled(db_path, sql, spill_path, page_size=PAGE_SIZE, max_rows=MAX_ROWS):
+    # First page plus total row count. Every row is read once and written page
+    # by page to spill_path, so later pages never re-run the query; without
+    # pyarrow only the first page is read and later pages come from
+    # fetch_result_page using the governed SQL.
+    try:
+        with span("sql_execution"), execute_query(db_path, sql, max_rows) as result:
+            if spill_supported():
+                pages = iter(lambda: result.fetch_page(page_size), [])
+                rows, total_rows, spill = spill_pages(spill_path, result.columns, pages)
+            else:
+                rows, spill = result.fetch_page(page_size), None
+                total_rows = len(rows) if len(rows) < page_size else result.total_rows()
+            observe("rows_returned", total_rows, buckets=SIZE_BUCKETS)
+            return {
+                "columns": result.columns,
+                "rows": rows,
+                "total_rows": total_rows,
+                "governed_sql": result.sql,
+                "governor": result.governor,
+                "spill": spill
+            }
+    except Exception as e:
+        raise RuntimeError(f"Error executing SQL on {db_path}:\n{sql}\n{e}")
+
+def init_metadata_db(metadata_db="metadata_store.db"):
+    init_schema(metadata_db)
+    init_embedding_index(metadata_db)
+    init_semantic_cache(metadata_db)
+    if sync_encoder(EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND, metadata_db):
+        invalidate_semantic_cache(metadata_db=metadata_db)
+    refresh_table_embeddings(get_missing_tables(metadata_db), metadata_db)
+    refresh_column_embeddings(get_missing_columns(metadata_db), metadata_db)
+
+def get_stored_schema(db_id, metadata_db="metadata_store.db"):
+    cursor = get_connection(metadata_db).execute("""
+        SELECT t.table_name, c.column_name, c.data_type
+        FROM tables t
+        JOIN columns c ON c.table_id = t.table_id
+        WHERE t.db_id = ?
+        ORDER BY t.table_id, c.position
+    """, (db_id,))
+    stored = {}
+    for table_name, column_name, data_type in cursor.fetchall():
+        columns, data_types = stored.setdefault(table_name, ([], []))
+        columns.append(column_name)
+        data_types.append(data_type)
+    return stored
 
-def insert_metadata(metadata_list, db_path="metadata_store.db"):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+def _normalize_columns(columns, data_types):
+    return [(col.strip().lower(), (dtype or "").strip().upper()) for col, dtype in zip(columns, data_types)]
+
+def diff_schema(db_id, parsed_metadata, metadata_db="metadata_store.db"):
+    stored = get_stored_schema(db_id, metadata_db)
+    report = {"added": [], "changed": [], "unchanged": [], "removed": []}
+
+    for table_name, columns, data_types in parsed_metadata:
+        if table_name not in stored:
+            report["added"].append(table_name)
+        elif _normalize_columns(columns, data_types) != _normalize_columns(*stored[table_name]):
+            report["changed"].append(table_name)
+        else:
+            report["unchanged"].append(table_name)
+
+    parsed_names = {table_name for table_name, _, _ in parsed_metadata}
+    report["removed"] = [table_name for table_name in stored if table_name not in parsed_names]
+    return report
+
+def insert_metadata(metadata_list, db_path="metadata_store.db", removed_tables=()):
+    # Rows replace whatever is stored for their (db_id, table_name); removed_tables
+    # are (db_id, table_name) pairs to drop. Everything happens in one transaction.
+    removed_tables = list(removed_tables)
+    conn = get_connection(db_path)
+    with span("metadata_insert", rows=len(metadata_list)), conn:
+        emptied = replace_tables(conn, metadata_list, removed_tables)
+    # A database re-created later starts again at schema version 0, so nothing
+    # cached under its old versions (SQL, prompt blocks) may outlive it.
+    for db_id in emptied:
+        invalidate_semantic_cache(db_id, db_path)
+        invalidate_db(db_id)
+        invalidate_table_blocks(db_id)
+
+    delete_table_embeddings(removed_tables, db_path)
+    table_intents = {}
     for entry in metadata_list:
-        cursor.execute("""
-            INSERT INTO metadata (db_id, table_name, column_name, data_type, table_intent, column_intent)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (
-            entry["db_id"],
-            entry["table_name"],
-            entry["column_name"],
-            entry["data_type"],
-            entry.get("table_intent"),
-            entry.get("column_intent")
-        ))
-    conn.commit()
-    conn.close()
-    
+        if entry.get("table_intent"):
+            table_intents[(entry["db_id"], entry["table_name"])] = entry["table_intent"]
+    refresh_table_embeddings(
+        [(db_id, table_name, intent) for (db_id, table_name), intent in table_intents.items()],
+        db_path
+    )
+
+    replaced_tables = {(entry["db_id"], entry["table_name"]) for entry in metadata_list}
+    delete_column_embeddings(list(replaced_tables) + removed_tables, db_path)
+    refresh_column_embeddings(
+        [
+            (entry["db_id"], entry["table_name"], entry["column_name"], entry.get("column_intent"))
+            for entry in metadata_list
+        ],
+        db_path
+    )
+
 def get_db_list(metadata_db="metadata_store.db"):
-    conn = sqlite3.connect(metadata_db)
-    cursor = conn.cursor()
-    cursor.execute("SELECT DISTINCT db_id FROM metadata")
-    dbs = [row[0] for row in cursor.fetchall()]
-    conn.close()
-    return dbs
-
-model = SentenceTransformer("all-MiniLM-L6-v2")
-
-def get_top_tables_by_semantic_similarity(question, top_k=4, metadata_db="metadata_store.db"):
-    query_embedding = model.encode(question, convert_to_tensor=True)
-
-    conn = sqlite3.connect(metadata_db)
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-    tables = cursor.fetchall()
-    print("📋 Available tables in DB:", tables)
-    
-    
-    cursor.execute("SELECT DISTINCT db_id, table_name, table_intent FROM metadata")
-    table_data = cursor.fetchall()
-    conn.close()
-
-    scored_tables = []
-    for db_id, table_name, table_intent in table_data:
-        if not table_intent:
-            continue
-        table_embedding = model.encode(table_intent, convert_to_tensor=True)
-        score = util.pytorch_cos_sim(query_embedding, table_embedding).item()
-        scored_tables.append((score, db_id, table_name))
+    cursor = get_connection(metadata_db).execute("SELECT db_id FROM databases ORDER BY db_id")
+    return [row[0] for row in cursor.fetchall()]
+
+def refresh_table_embeddings(table_rows, metadata_db="metadata_store.db", batch_size=64):
+    if not table_rows:
+        return
+    intents = [table_intent for _, _, table_intent in table_rows]
+    with span("embedding", kind="tables", texts=len(intents)):
+        embeddings = encode(intents, batch_size=batch_size)
+    upsert_table_embeddings(
+        [(db_id, table_name, emb) for (db_id, table_name, _), emb in zip(table_rows, embeddings)],
+        metadata_db
+    )
+
+def _column_text(column_name, column_intent):
+    return f"{column_name}: {column_intent}" if column_intent else column_name
+
+def refresh_column_embeddings(column_rows, metadata_db="metadata_store.db", batch_size=64):
+    # column_rows: (db_id, table_name, column_name, column_intent)
+    if not column_rows:
+        return
+    texts = [_column_text(column_name, column_intent) for _, _, column_name, column_intent in column_rows]
+    with span("embedding", kind="columns", texts=len(texts)):
+        embeddings = encode(texts, batch_size=batch_size)
+    upsert_column_embeddings(
+        [(db_id, table_name, column_name, emb) for (db_id, table_name, column_name, _), emb in zip(column_rows, embeddings)],
+        metadata_db
+    )
+
+def embed_question(question):
+    with span("embedding", kind="question", texts=1):
+        return encode([question])[0]
 
-    scored_tables.sort(reverse=True)
-    return [(db_id, table_name) for score, db_id, table_name in scored_tables[:top_k]]
+def get_top_tables_by_semantic_similarity(question, top_k=4, metadata_db="metadata_store.db", question_embedding=None,
+                                          db_id=None):
+    # Only the tables of one database are ranked; without a db_id the
+    # database of the best-matching table is used.
+    query_embedding = question_embedding if question_embedding is not None else embed_question(question)
+    with span("retrieval", top_k=top_k):
+        if db_id is None:
+            best = search_tables(query_embedding, 1, metadata_db)
+            if not best:
+                return []
+            db_id = best[0][1]
+        scored_tables = search_tables(query_embedding, top_k, metadata_db, db_id)
+    return [(db_id, table_name) for score, db_id, table_name in scored_tables]
 
 def get_column_info_by_tables(db_id, table_names, metadata_db="metadata_store.db"):
-    conn = sqlite3.connect(metadata_db)
-    cursor = conn.cursor()
-
-    table_map = {}
-    for table in table_names:
-        cursor.execute("""
-            SELECT column_name, data_type, column_intent
-            FROM metadata
-            WHERE db_id = ? AND table_name = ?
-        """, (db_id, table))
-        table_map[table] = cursor.fetchall()
-
-    conn.close()
+    table_map = {table: [] for table in table_names}
+    for table_name, _, col_name, col_type, col_intent, _, _ in fetch_schema_rows(db_id, table_names, metadata_db):
+        if col_name is not None:
+            table_map[table_name].append((col_name, col_type, col_intent))
     return table_map
 
-def build_semantic_info_dict(question, top_k=4, metadata_db="metadata_store.db"):
-    top_tables = get_top_tables_by_semantic_similarity(question, top_k, metadata_db)
+def prune_columns(question_embedding, db_id, db_schema, column_top_k=COLUMN_TOP_K, metadata_db="metadata_store.db"):
+    # Scores every column against the question ("column_scores") and keeps the
+    # column_top_k best per table, plus primary key and foreign key columns so
+    # joins stay possible. Dropped columns move to "omitted_columns".
+    keys, matrix = load_column_embeddings(db_id, [table["table_name"] for table in db_schema], metadata_db)
+    scores = {}
+    if keys:
+        # One matrix-vector product scores every candidate column at once.
+        column_scores = matrix @ np.asarray(question_embedding, dtype=EMBEDDING_DTYPE).reshape(-1)
+        scores = dict(zip(keys, column_scores.tolist()))
+
+    for table in db_schema:
+        names = [col.split(" (", 1)[0] for col in table["columns"]]
+        table["column_scores"] = {
+            name: scores[(table["table_name"], name)] for name in names if (table["table_name"], name) in scores
+        }
+        if not column_top_k or len(names) <= column_top_k:
+            continue
+        ranked = sorted(
+            (name for name in names if name.lower() not in table["key_columns"]),
+            key=lambda name: table["column_scores"].get(name, float("-inf")),
+            reverse=True
+        )
+        keep = set(ranked[:column_top_k])
+        kept, omitted = [], []
+        for name, col in zip(names, table["columns"]):
+            (kept if name in keep or name.lower() in table["key_columns"] else omitted).append(col)
+        table["columns"] = kept
+        table["omitted_columns"] = omitted
+    return db_schema
+
+def build_semantic_info_dict(question, top_k=4, metadata_db="metadata_store.db", question_embedding=None,
+                             column_top_k=COLUMN_TOP_K, db_id=None):
+    if question_embedding is None:
+        question_embedding = embed_question(question)
+    top_tables = get_top_tables_by_semantic_similarity(question, top_k, metadata_db, question_embedding, db_id)
     if not top_tables:
         return "", []
 
     db_id = top_tables[0][0]
     table_names = [table for _, table in top_tables]
 
-    column_data = get_column_info_by_tables(db_id, table_names, metadata_db)
-
-    conn = sqlite3.connect(metadata_db)
-    cursor = conn.cursor()
-
-    db_schema = []
-    for table in table_names:
-        columns_raw = column_data[table]  
-        columns = []
-        column_intents = {}
-
-        for col_name, col_type, col_intent in columns_raw:
-            columns.append(f"{col_name} ({col_type})")
-            column_intents[col_name.lower()] = col_intent
-
-        cursor.execute("""
-            SELECT DISTINCT table_intent
-            FROM metadata
-            WHERE db_id = ? AND table_name = ?
-        """, (db_id, table))
-        table_intent_row = cursor.fetchone()
-        table_intent = table_intent_row[0] if table_intent_row else ""
-
-        db_schema.append({
-            "table_name": table,
-            "table_intent": table_intent,
-            "columns": columns,
-            "column_intents": column_intents
-        })
-
-    conn.close()
-    return db_id, db_schema
-
-def build_prompt(question, db, db_schema, include_sql=True):
-    lines = []
-    lines.append(f"### Database: {db}")
-    lines.append("")
-
+    with span("schema_assembly", tables=len(table_names)):
+        tables = {}
+        for table_name, table_intent, col_name, col_type, col_intent, is_primary_key, ref_table in fetch_schema_rows(
+            db_id, table_names, metadata_db
+        ):
+            table = tables.setdefault(table_name, {
+                "table_name": table_name,
+                "table_intent": table_intent or "",
+                "columns": [],
+                "column_intents": {},
+                "key_columns": set()
+            })
+            if col_name is None:
+                continue
+            table["columns"].append(f"{col_name} ({col_type})")
+            table["column_intents"][col_name.lower()] = col_intent
+            if is_primary_key or ref_table:
+                table["key_columns"].add(col_name.lower())
 
-    for table in db_schema:
-        lines.append(f"### Table Schema: {table['table_name']} - {table['table_intent']}")
-        for col in table["columns"]:
-            col_name, col_type = col.split(" (", 1)
-            col_type = col_type.rstrip(")")
-            col_intent = table["column_intents"].get(col_name.lower(), "")
-            lines.append(f"- {col_name} ({col_type}): {col_intent}")
-        lines.append("")
-
-    lines.append(f"### Question: {question}")
-    if include_sql:
-        lines.append("### SQL:")
+        db_schema = [
+            tables.get(table, {"table_name": table, "table_intent": "", "columns": [], "column_intents": {}, "key_columns": set()})
+            for table in table_names
+        ]
+        db_schema = prune_columns(question_embedding, db_id, db_schema, column_top_k, metadata_db)
+        observe("schema_columns", sum(len(table["columns"]) for table in db_schema), buckets=SIZE_BUCKETS)
+    return db_id, db_schema
 
-    return "\n".join(lines)
+def column_pruning_stats(question, db, db_schema):
+    full_schema = [
+        {**table, "columns": table["columns"] + table.get("omitted_columns", [])}
+        for table in db_schema
+    ]
+    prompt_tokens = count_tokens(build_prompt(question, db, db_schema))
+    return {
+        "columns_dropped": sum(len(table.get("omitted_columns", [])) for table in db_schema),
+        "prompt_tokens": prompt_tokens,
+        "tokens_saved": count_tokens(build_prompt(question, db, full_schema)) - prompt_tokens
+    }
 
+def build_prompt(question, db, db_schema, include_sql=True):
+    return _build_prompt(question, db, db_schema, include_sql)
@@ -0,0 +1,84 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from embedding_index import IVFIndex, top_k_indices, EMBEDDING_DTYPE
+
+
+def normalize(vectors):
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(EMBEDDING_DTYPE)
+
+
+def synthetic_embeddings(num_tables, dim, topics, rng):
+    # Table intents cluster by topic, like real schemas do; each table is a
+    # noisy copy of its topic direction.
+    centers = rng.standard_normal((topics, dim))
+    assignment = rng.integers(topics, size=num_tables)
+    return normalize(centers[assignment] + 1.5 * rng.standard_normal((num_tables, dim)))
+
+
+def percentiles(samples):
+    values = np.asarray(samples) * 1000
+    return {"p50_ms": float(np.percentile(values, 50)), "p95_ms": float(np.percentile(values, 95))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall and latency of the IVF table index against exact search.")
+    parser.add_argument("--tables", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=4)
+    parser.add_argument("--n-lists", type=int, help="Defaults to sqrt(tables)")
+    parser.add_argument("--n-probe", default="1,2,4,8,16,32")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    matrix = synthetic_embeddings(args.tables, args.dim, args.topics, rng)
+    picks = rng.integers(args.tables, size=args.queries)
+    # Questions land near, not on, a table: unit vectors plus noise of norm ~0.5.
+    queries = normalize(matrix[picks] + 0.5 * rng.standard_normal((args.queries, args.dim)) / np.sqrt(args.dim))
+
+    exact, exact_latency = [], []
+    for query in queries:
+        start = time.perf_counter()
+        exact.append(set(top_k_indices(matrix @ query, args.top_k).tolist()))
+        exact_latency.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    index = IVFIndex(matrix, n_lists=args.n_lists)
+    build_seconds = time.perf_counter() - start
+
+    report = {
+        "config": vars(args),
+        "n_lists": len(index.centroids),
+        "build_seconds": build_seconds,
+        "exact": percentiles(exact_latency),
+        "ivf": {}
+    }
+    for n_probe in map(int, args.n_probe.split(",")):
+        hits, latency = 0, []
+        for query, truth in zip(queries, exact):
+            start = time.perf_counter()
+            ids, _ = index.search(query, args.top_k, n_probe)
+            latency.append(time.perf_counter() - start)
+            hits += len(truth & set(ids.tolist()))
+        timing = percentiles(latency)
+        report["ivf"][n_probe] = {
+            f"recall@{args.top_k}": hits / (len(queries) * args.top_k),
+            **timing,
+            "speedup_p50": report["exact"]["p50_ms"] / timing["p50_ms"]
+        }
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
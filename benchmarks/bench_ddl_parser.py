@@ -0,0 +1,99 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from ddl_parser import iter_create_tables
+
+TYPES = ["INTEGER", "TEXT", "VARCHAR(255)", "DECIMAL(10, 2)", "DATE", "REAL", "BOOLEAN"]
+
+
+def generate_ddl(path, num_tables, num_columns, seed=0):
+    rng = random.Random(seed)
+    with open(path, "w") as f:
+        for t in range(num_tables):
+            f.write(f"-- table {t}\n")
+            f.write(f'CREATE TABLE IF NOT EXISTS "table_{t}" (\n')
+            f.write(f"  id INTEGER NOT NULL,\n")
+            for c in range(num_columns - 1):
+                default = " DEFAULT 'n/a; ok'" if rng.random() < 0.1 else ""
+                f.write(f"  col_{c} {rng.choice(TYPES)}{default},\n")
+            if t:
+                f.write(f"  parent_id INTEGER,\n")
+                f.write(f"  FOREIGN KEY (parent_id) REFERENCES table_{rng.randrange(t)} (id),\n")
+            f.write("  PRIMARY KEY (id)\n);\n\n")
+
+
+def _parse_file(path):
+    tables = columns = 0
+    with open(path) as f:
+        for table in iter_create_tables(f):
+            tables += 1
+            columns += len(table["columns"])
+    return tables, columns
+
+
+def bench_streaming(path):
+    start = time.perf_counter()
+    tables, columns = _parse_file(path)
+    elapsed = time.perf_counter() - start
+
+    # Separate pass: tracemalloc slows parsing down too much to time both at once.
+    tracemalloc.start()
+    _parse_file(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"tables": tables, "columns": columns, "seconds": elapsed, "peak_traced_mb": peak / 2**20}
+
+
+def bench_sqlparse(path, max_tables):
+    import sqlparse
+
+    with open(path) as f:
+        ddl = f.read()
+    statements = [s for s in sqlparse.split(ddl) if s.strip()][:max_tables]
+    sample = "\n".join(statements)
+    start = time.perf_counter()
+    sqlparse.parse(sample)
+    elapsed = time.perf_counter() - start
+    return {"tables": len(statements), "seconds": elapsed, "bytes": len(sample.encode("utf-8"))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput of the streaming DDL parser on a synthetic dump.")
+    parser.add_argument("--tables", type=int, default=10000)
+    parser.add_argument("--columns", type=int, default=20)
+    parser.add_argument("--sqlparse-tables", type=int, default=0,
+                        help="also time sqlparse.parse on the first N tables for comparison")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "schema.sql")
+        generate_ddl(path, args.tables, args.columns)
+        size_mb = os.path.getsize(path) / 2**20
+
+        result = bench_streaming(path)
+        result.update({
+            "ddl_mb": size_mb,
+            "mb_per_second": size_mb / result["seconds"],
+            "tables_per_second": result["tables"] / result["seconds"],
+        })
+        report = {"streaming_parser": result}
+
+        if args.sqlparse_tables:
+            baseline = bench_sqlparse(path, args.sqlparse_tables)
+            baseline["mb_per_second"] = baseline["bytes"] / 2**20 / baseline["seconds"]
+            baseline["tables_per_second"] = baseline["tables"] / baseline["seconds"]
+            report["sqlparse"] = baseline
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+
+TABLE_INTENTS = [
+    "Stores customer accounts with contact details and signup dates.",
+    "Records each order placed by a customer, including totals and status.",
+    "Lists the individual products contained in every order.",
+    "Catalog of products with prices, categories and stock levels.",
+    "Tracks payments made against orders and their settlement state.",
+    "Employees of the company with their roles, salaries and managers.",
+    "Departments and the budgets assigned to them.",
+    "Shipments sent to customers with carrier and delivery dates.",
+    "Product reviews written by customers with star ratings.",
+    "Warehouses and the inventory quantities they hold.",
+    "Marketing campaigns and the discounts they offered.",
+    "Support tickets opened by customers and their resolution times."
+]
+QUESTIONS = [
+    "How many orders were placed last month?",
+    "Which customers spent the most money?",
+    "What is the average salary per department?",
+    "List products that are out of stock.",
+    "Which carrier delivers the fastest?",
+    "What is the average rating of each product?",
+    "How many support tickets are still open?",
+    "Which campaign produced the largest discount?"
+]
+SQL_SCHEMA = [
+    {
+        "table_name": "customers",
+        "table_intent": TABLE_INTENTS[0],
+        "columns": ["customer_id (INTEGER)", "name (TEXT)", "email (TEXT)", "signup_date (DATE)"],
+        "column_intents": {"customer_id": "Unique customer id.", "name": "Customer name.",
+                           "email": "Contact email.", "signup_date": "Date the account was created."}
+    },
+    {
+        "table_name": "orders",
+        "table_intent": TABLE_INTENTS[1],
+        "columns": ["order_id (INTEGER)", "customer_id (INTEGER)", "total (REAL)", "order_date (DATE)"],
+        "column_intents": {"order_id": "Unique order id.", "customer_id": "Customer who placed the order.",
+                           "total": "Order total amount.", "order_date": "Date the order was placed."}
+    }
+]
+TOP_K = 5
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentiles(values):
+    ordered = sorted(values)
+    pick = lambda pct: 1000 * ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+    return {"mean": 1000 * statistics.mean(ordered), "p50": pick(50), "p95": pick(95)}
+
+
+def run_encoder(backend, repeat):
+    import numpy as np
+    from embeddings import EMBEDDING_MODEL_NAME
+    from inference_backends import load_sentence_encoder
+
+    start = time.perf_counter()
+    model = load_sentence_encoder(EMBEDDING_MODEL_NAME, backend)
+    load_seconds = time.perf_counter() - start
+
+    encode = lambda texts: model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+    intents = encode(TABLE_INTENTS)
+    latencies, rankings, scores = [], [], []
+    for _ in range(repeat):
+        for question in QUESTIONS:
+            start = time.perf_counter()
+            encode([question])
+            latencies.append(time.perf_counter() - start)
+    for question in QUESTIONS:
+        question_scores = intents @ encode([question])[0]
+        rankings.append(np.argsort(-question_scores)[:TOP_K].tolist())
+        scores.append(question_scores.tolist())
+
+    start = time.perf_counter()
+    encode(TABLE_INTENTS * 8)
+    batch_seconds = time.perf_counter() - start
+    return {
+        "load_seconds": load_seconds,
+        "latency_ms": percentiles(latencies),
+        "batch_of_96_ms": 1000 * batch_seconds,
+        "outputs": {"rankings": rankings, "scores": scores}
+    }
+
+
+def run_sql(backend, repeat, prompts):
+    from inference_backends import QUERY_MODEL_NAME, HF_TOKEN, load_seq2seq
+    import model_server
+
+    start = time.perf_counter()
+    model_server._query_model = load_seq2seq(QUERY_MODEL_NAME, backend, token=HF_TOKEN)
+    load_seconds = time.perf_counter() - start
+
+    latencies, outputs = [], []
+    for i in range(repeat):
+        for prompt in prompts:
+            start = time.perf_counter()
+            sql = model_server.generate_queries([prompt])[0]
+            latencies.append(time.perf_counter() - start)
+            if i == 0:
+                outputs.append(sql)
+
+    start = time.perf_counter()
+    model_server.generate_queries(prompts)
+    batch_seconds = time.perf_counter() - start
+    return {
+        "load_seconds": load_seconds,
+        "latency_ms": percentiles(latencies),
+        f"batch_of_{len(prompts)}_ms": 1000 * batch_seconds,
+        "outputs": {"sql": outputs}
+    }
+
+
+def load_prompts(samples):
+    if samples:
+        with open(samples) as f:
+            return [json.loads(line)["prompt"] for line in f if line.strip()]
+    from prompt_builder import build_prompt
+    return [build_prompt(question, "shop.db", SQL_SCHEMA) for question in QUESTIONS]
+
+
+def worker(args):
+    if args.worker_model == "encoder":
+        result = run_encoder(args.worker_backend, args.repeat)
+    else:
+        result = run_sql(args.worker_backend, args.repeat, load_prompts(args.samples))
+    result["peak_rss_mb"] = peak_rss_mb()
+    print(json.dumps(result))
+
+
+def encoder_parity(baseline, candidate):
+    import numpy as np
+
+    top1 = [b[0] == c[0] for b, c in zip(baseline["rankings"], candidate["rankings"])]
+    overlap = [len(set(b) & set(c)) / TOP_K for b, c in zip(baseline["rankings"], candidate["rankings"])]
+    return {
+        "top1_agreement": sum(top1) / len(top1),
+        f"top{TOP_K}_overlap": sum(overlap) / len(overlap),
+        "max_score_delta": float(np.max(np.abs(np.array(baseline["scores"]) - np.array(candidate["scores"]))))
+    }
+
+
+def sql_parity(baseline, candidate):
+    matches = [b.strip() == c.strip() for b, c in zip(baseline["sql"], candidate["sql"])]
+    return {
+        "exact_match": sum(matches) / len(matches),
+        "mismatches": [i for i, match in enumerate(matches) if not match]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare inference backends for latency, memory and output parity.")
+    parser.add_argument("--backends", default="torch,torch-int8,onnx,onnx-int8")
+    parser.add_argument("--models", default="encoder,sql", help="Comma-separated subset of: encoder, sql")
+    parser.add_argument("--samples", help="JSONL file with a 'prompt' field per line, e.g. the fine-tuning set")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--worker-backend", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-model", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker_backend:
+        worker(args)
+        return
+
+    report = {}
+    for model in args.models.split(","):
+        results = {}
+        # Every backend runs in its own process so peak RSS is not shared.
+        for backend in args.backends.split(","):
+            command = [sys.executable, __file__, "--worker-backend", backend, "--worker-model", model,
+                       "--repeat", str(args.repeat)]
+            if args.samples:
+                command += ["--samples", args.samples]
+            completed = subprocess.run(command, capture_output=True, text=True)
+            if completed.returncode != 0:
+                results[backend] = {"error": completed.stderr.strip().splitlines()[-1:]}
+                continue
+            results[backend] = json.loads(completed.stdout.strip().splitlines()[-1])
+
+        baseline = results.get("torch", {}).get("outputs")
+        for backend, result in results.items():
+            outputs = result.pop("outputs", None)
+            if baseline and outputs and backend != "torch":
+                result["parity"] = encoder_parity(baseline, outputs) if model == "encoder" else sql_parity(baseline, outputs)
+        report[model] = results
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
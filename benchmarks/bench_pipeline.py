@@ -0,0 +1,253 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
+
+from stub_server import start_stub_server
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "pipeline.json")
+TOPICS = [
+    "customer", "order", "product", "payment", "employee", "department", "shipment", "review",
+    "warehouse", "campaign", "ticket", "invoice", "supplier", "store", "account", "session"
+]
+TYPES = ["INTEGER", "TEXT", "VARCHAR(255)", "DECIMAL(10, 2)", "DATE", "REAL"]
+STAGES = [
+    "extract_schema_metadata", "generate_intents", "insert_metadata",
+    "get_top_tables_by_semantic_similarity", "build_semantic_info_dict", "build_prompt",
+    "generate_query", "run_sql_query"
+]
+EMBEDDING_DIM = 384
+
+
+class StubEncoder:
+    # Hashed bag of words: deterministic and free, so timings measure the pipeline, not the model.
+    def encode(self, texts, batch_size=64, normalize_embeddings=True, convert_to_numpy=True):
+        vectors = np.zeros((len(texts), EMBEDDING_DIM), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in text.lower().replace("_", " ").split():
+                word = word.strip("?.,:;()")
+                vectors[i, int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % EMBEDDING_DIM] += 1
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+
+class StubTokenizer:
+    def __call__(self, text, add_special_tokens=True):
+        return {"input_ids": text.split() + (["</s>"] if add_special_tokens else [])}
+
+
+def table_name(t):
+    return f"{TOPICS[t % len(TOPICS)]}_{t}"
+
+
+def generate_ddl(num_tables, num_columns, rng):
+    statements = []
+    for t in range(num_tables):
+        lines = [f"  id INTEGER NOT NULL"]
+        lines += [f"  {TOPICS[t % len(TOPICS)]}_attr_{c} {rng.choice(TYPES)}" for c in range(num_columns - 1)]
+        if t:
+            parent = rng.randrange(t)
+            lines.append(f"  {table_name(parent)}_id INTEGER")
+            lines.append(f"  FOREIGN KEY ({table_name(parent)}_id) REFERENCES {table_name(parent)} (id)")
+        lines.append("  PRIMARY KEY (id)")
+        statements.append(f"CREATE TABLE {table_name(t)} (\n" + ",\n".join(lines) + "\n);")
+    return "\n\n".join(statements)
+
+
+def value_for(data_type, rng):
+    if data_type.startswith(("INTEGER", "DECIMAL", "REAL")):
+        return rng.randrange(1000)
+    if data_type == "DATE":
+        return f"2024-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}"
+    return f"value_{rng.randrange(100)}"
+
+
+def create_database(path, ddl, tables, num_rows, rng):
+    conn = sqlite3.connect(path)
+    conn.executescript(ddl)
+    for name, columns, data_types in tables:
+        placeholders = ",".join("?" * len(columns))
+        rows = [
+            [i] + [value_for(dtype.upper(), rng) for dtype in data_types[1:]]
+            for i in range(num_rows)
+        ]
+        conn.executemany(f"INSERT INTO {name} VALUES ({placeholders})", rows)
+    conn.commit()
+    conn.close()
+
+
+def percentiles(samples):
+    values = np.asarray(samples) * 1000
+    return {
+        "n": len(samples),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99))
+    }
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(args, workdir):
+    from ddl_parser import extract_schema_metadata
+    from intent_infer import iter_generate_intents, get_api_session
+    from utils import (
+        init_metadata_db, insert_metadata, get_top_tables_by_semantic_similarity, build_semantic_info_dict,
+        build_prompt, run_sql_query
+    )
+
+    timings = defaultdict(list)
+    rss = {}
+    rng = random.Random(args.seed)
+    metadata_db = os.path.join(workdir, "metadata_store.db")
+    # No simulated model cost and no batching wait, so the stages measured are the pipeline's own.
+    server, url = start_stub_server(max_wait_ms=0, batch_seconds=0, item_seconds=0)
+
+    def timed(stage, fn, *fn_args, **fn_kwargs):
+        start = time.perf_counter()
+        result = fn(*fn_args, **fn_kwargs)
+        timings[stage].append(time.perf_counter() - start)
+        return result
+
+    try:
+        init_metadata_db(metadata_db)
+        db_ids = []
+        for d in range(args.dbs):
+            db_id = f"bench_{d}.db"
+            db_path = os.path.join(workdir, db_id)
+            ddl = generate_ddl(args.tables, args.columns, rng)
+            parsed = timed("extract_schema_metadata", extract_schema_metadata, ddl)
+            create_database(db_path, ddl, parsed, args.rows, rng)
+
+            responses = [None] * len(parsed)
+            start = time.perf_counter()
+            for index, response in iter_generate_intents(url, parsed, cache_db=metadata_db):
+                responses[index] = response
+            timings["generate_intents"].append(time.perf_counter() - start)
+
+            rows = [
+                {
+                    "db_id": db_id,
+                    "table_name": name,
+                    "column_name": col,
+                    "data_type": dtype,
+                    "table_intent": response["table_intent"],
+                    "column_intent": response["column_intents"].get(col.lower(), "")
+                }
+                for (name, columns, data_types), response in zip(parsed, responses)
+                for col, dtype in zip(columns, data_types)
+            ]
+            timed("insert_metadata", insert_metadata, rows, metadata_db)
+            db_ids.append(db_id)
+        rss["after_ingestion_mb"] = peak_rss_mb()
+
+        session = get_api_session()
+        for q in range(args.questions):
+            topic = TOPICS[rng.randrange(min(args.tables, len(TOPICS)))]
+            question = f"How many {topic} records have {topic} attr {rng.randrange(args.columns - 1)} above 10?"
+            # Like the query page: the question is asked against a chosen database.
+            selected_db = db_ids[q % len(db_ids)]
+            timed("get_top_tables_by_semantic_similarity", get_top_tables_by_semantic_similarity,
+                  question, args.top_k, metadata_db, db_id=selected_db)
+            db_id, db_schema = timed("build_semantic_info_dict", build_semantic_info_dict,
+                                     question, args.top_k, metadata_db, db_id=selected_db)
+            prompt = timed("build_prompt", build_prompt, question, db_id, db_schema)
+            response = timed("generate_query", session.post, f"{url}/generate_query", json={"prompt": prompt})
+            sql = response.json()["sql_query"]
+            timed("run_sql_query", run_sql_query, os.path.join(workdir, db_id), sql)
+        rss["after_questions_mb"] = peak_rss_mb()
+    finally:
+        server.shutdown()
+
+    return {stage: percentiles(timings[stage]) for stage in STAGES if timings[stage]}, rss
+
+
+def compare(report, baseline, tolerance, noise_floor_ms):
+    # A stage regresses when its p50 or p95 grows by more than `tolerance`
+    # and by more than the noise floor in absolute terms.
+    comparison = {}
+    for stage, current in report["stages"].items():
+        previous = baseline["stages"].get(stage)
+        if not previous:
+            continue
+        entry = {}
+        for metric in ("p50_ms", "p95_ms"):
+            ratio = current[metric] / previous[metric] if previous[metric] else float("inf")
+            entry[metric] = {"baseline": previous[metric], "current": current[metric], "ratio": ratio}
+            if ratio > 1 + tolerance and current[metric] - previous[metric] > noise_floor_ms:
+                entry["regressed"] = True
+        comparison[stage] = entry
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end ingestion and question-answering benchmark.")
+    parser.add_argument("--dbs", type=int, default=2)
+    parser.add_argument("--tables", type=int, default=20)
+    parser.add_argument("--columns", type=int, default=12)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stub-encoder", action="store_true",
+                        help="Use a hashing encoder and whitespace tokenizer instead of the real models")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--noise-floor-ms", type=float, default=0.5)
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    if args.stub_encoder:
+        import embeddings
+        import prompt_builder
+        embeddings._model = StubEncoder()
+        prompt_builder._tokenizer = StubTokenizer()
+
+    config = {key: getattr(args, key) for key in ("dbs", "tables", "columns", "rows", "questions", "top_k", "seed",
+                                                  "stub_encoder")}
+    with tempfile.TemporaryDirectory() as workdir:
+        start = time.perf_counter()
+        stages, rss = run(args, workdir)
+        total_seconds = time.perf_counter() - start
+
+    report = {"config": config, "total_seconds": total_seconds, "stages": stages, "peak_rss_mb": rss}
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report["baseline_config_matches"] = baseline["config"] == config
+        report["comparison"] = compare(report, baseline, args.tolerance, args.noise_floor_ms)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+    regressed = [stage for stage, entry in report.get("comparison", {}).items() if entry.get("regressed")]
+    if regressed and args.fail_on_regression:
+        print(f"Regressed stages: {', '.join(regressed)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# The fastapi-free stub; pass --url to load-test model_server.py itself.
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server", "stub_server.py")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_stub_server(port, max_batch_size, max_wait_ms):
+    process = subprocess.Popen([
+        sys.executable, SERVER_SCRIPT, "--port", str(port),
+        "--max-batch-size", str(max_batch_size), "--max-wait-ms", str(max_wait_ms)
+    ])
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            requests.get(f"{url}/metrics", timeout=1)
+            return process, url
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("Stub model server did not start within 30s")
+
+
+def make_payload(endpoint, i):
+    if endpoint == "query":
+        return "/generate_query", {"prompt": f"### Database: bench.db\n\n### Question: how many rows in table_{i}?\n### SQL:"}
+    return "/generate_intents", {
+        "table_name": f"table_{i}",
+        "columns": ["id", "name", "created_at"],
+        "data_types": ["INTEGER", "TEXT", "DATE"]
+    }
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_level(url, endpoint, concurrency, total_requests):
+    metrics_before = requests.get(f"{url}/metrics").json()[endpoint]
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_maxsize=concurrency))
+
+    def one(i):
+        path, payload = make_payload(endpoint, i)
+        start = time.perf_counter()
+        response = session.post(f"{url}{path}", json=payload, timeout=300)
+        response.raise_for_status()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(one, range(total_requests)))
+    elapsed = time.perf_counter() - start
+
+    metrics_after = requests.get(f"{url}/metrics").json()[endpoint]
+    batches = metrics_after["batches"] - metrics_before["batches"]
+    return {
+        "concurrency": concurrency,
+        "requests": total_requests,
+        "throughput_rps": total_requests / elapsed,
+        "latency_ms": {
+            "mean": 1000 * statistics.mean(latencies),
+            "p50": 1000 * percentile(latencies, 50),
+            "p95": 1000 * percentile(latencies, 95)
+        },
+        "avg_batch_size": (metrics_after["requests"] - metrics_before["requests"]) / batches if batches else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure model server throughput as concurrency grows.")
+    parser.add_argument("--url", help="Running server to test; by default a stub server is started")
+    parser.add_argument("--endpoint", choices=["query", "intent"], default="query")
+    parser.add_argument("--concurrency", default="1,2,4,8,16")
+    parser.add_argument("--requests", type=int, default=64, help="Requests per concurrency level")
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--max-wait-ms", type=float, default=10)
+    args = parser.parse_args()
+
+    process = None
+    url = args.url
+    if url is None:
+        process, url = start_stub_server(free_port(), args.max_batch_size, args.max_wait_ms)
+    try:
+        levels = [
+            run_level(url, args.endpoint, int(c), args.requests)
+            for c in args.concurrency.split(",")
+        ]
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+
+    print(json.dumps({"url": url, "endpoint": args.endpoint, "levels": levels}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from batch_qa import run_batch, DB_PATH_TEMPLATE, SQL_WORKERS, EVAL_TIME_BUDGET_SECONDS
+from intent_infer import API_MAX_WORKERS
+
+
+def load_examples(path):
+    # JSONL, or a JSON array such as Spider's dev.json.
+    with open(path) as f:
+        text = f.read()
+    if text.lstrip().startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a file of questions through the pipeline and score them.")
+    parser.add_argument("input", help="JSONL (or JSON array) of {db_id, question, optional gold_sql/query}")
+    parser.add_argument("--model-server-url", default=os.getenv("MODEL_SERVER_URL"))
+    parser.add_argument("--metadata-db", default="metadata_store.db")
+    parser.add_argument("--db-path-template", default=DB_PATH_TEMPLATE,
+                        help="e.g. spider/database/{db_id}/{db_id}.sqlite")
+    parser.add_argument("--top-k", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=API_MAX_WORKERS, help="Generation requests in flight")
+    parser.add_argument("--sql-workers", type=int, default=SQL_WORKERS, help="Processes executing SQL")
+    parser.add_argument("--time-budget", type=float, default=EVAL_TIME_BUDGET_SECONDS,
+                        help="Seconds each predicted or gold query may run; 0 for no limit")
+    parser.add_argument("--limit", type=int, help="Only the first N questions")
+    parser.add_argument("--predictions", help="Write per-question results to this JSONL file")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    if not args.model_server_url:
+        parser.error("--model-server-url or MODEL_SERVER_URL is required")
+
+    examples = load_examples(args.input)[:args.limit]
+    results, report = run_batch(examples, args.model_server_url, args.metadata_db, args.db_path_template,
+                                args.top_k, args.concurrency, args.sql_workers, args.time_budget)
+
+    if args.predictions:
+        with open(args.predictions, "w") as f:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from tqdm import tqdm
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from intent_infer import API_BATCH_SIZE, generate_intents_batch
+
+TABLES_FILE = "./raw_data/spider/tables.json"
+OUTPUT_FILE = "./preprocessed_data/spider/spider_with_intents.json"
+TABLES_PER_TASK = 32
+
+
+def iter_tables(schemas):
+    # Spider/CoSQL tables.json: one entry per database, columns as [table_index, name].
+    for schema in schemas:
+        db_id = schema.get("db_id", "")
+        column_types = schema.get("column_types", [])
+        table_columns = {}
+        for col_idx, (table_idx, col_name) in enumerate(schema.get("column_names", [])):
+            if table_idx == -1:
+                continue
+            col_type = column_types[col_idx] if col_idx < len(column_types) else "unknown"
+            table_columns.setdefault(table_idx, []).append((col_name, col_type))
+        for table_idx, table_name in enumerate(schema.get("table_names", [])):
+            cols = table_columns.get(table_idx, [])
+            yield {
+                "db_id": db_id,
+                "table_name": table_name,
+                "col_names": [col_name for col_name, _ in cols],
+                "col_types": [col_type for _, col_type in cols]
+            }
+
+
+def load_checkpoint(path):
+    # Append-only JSONL of finished tables, one record per line.
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            record = json.loads(line)
+            done[(record["db_id"], record["table_name"])] = record
+    return done
+
+
+def drop_torn_line(path):
+    # Cut a partial last line so the next append starts on a fresh line.
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+
+def _init_worker(threads):
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+
+
+def extract_batch(tables, batch_size=API_BATCH_SIZE, cache_db=None):
+    results = generate_intents_batch(
+        [(t["table_name"], t["col_names"], t["col_types"]) for t in tables],
+        batch_size=batch_size, cache_db=cache_db
+    )
+    return [
+        {
+            "db_id": t["db_id"],
+            "table_name": t["table_name"],
+            "columns": [f"{name} ({dtype})" for name, dtype in zip(t["col_names"], t["col_types"])],
+            "table_intent": table_intent,
+            "column_intents": column_intents
+        }
+        for t, (table_intent, column_intents) in zip(tables, results)
+    ]
+
+
+def run(pending, checkpoint, workers, batch_size, cache_db):
+    # Only this process writes the checkpoint, so lines never interleave.
+    tasks = [pending[i:i + TABLES_PER_TASK] for i in range(0, len(pending), TABLES_PER_TASK)]
+    with open(checkpoint, "a") as out, tqdm(total=len(pending), unit="table") as progress:
+        def save(records):
+            out.write("".join(json.dumps(r) + "\n" for r in records))
+            out.flush()
+            progress.update(len(records))
+
+        if workers <= 1:
+            for task in tasks:
+                save(extract_batch(task, batch_size, cache_db))
+            return
+
+        # Each worker loads its own model copy; split the cores between them.
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(threads,)) as pool:
+            futures = [pool.submit(extract_batch, task, batch_size, cache_db) for task in tasks]
+            for future in as_completed(futures):
+                save(future.result())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Infer table and column intents for a Spider-style tables.json.")
+    parser.add_argument("--tables", default=TABLES_FILE)
+    parser.add_argument("--output", default=OUTPUT_FILE)
+    parser.add_argument("--checkpoint", help="Defaults to <output>.partial.jsonl")
+    parser.add_argument("--batch-size", type=int, default=API_BATCH_SIZE, help="Tables per padded generate call")
+    parser.add_argument("--workers", type=int, default=1, help="CPU worker processes, each with its own model")
+    parser.add_argument("--cache-db", help="Also read and fill the intent cache in this SQLite file")
+    args = parser.parse_args()
+
+    with open(args.tables) as f:
+        tables = list(iter_tables(json.load(f)))
+
+    checkpoint = args.checkpoint or args.output + ".partial.jsonl"
+    drop_torn_line(checkpoint)
+    done = load_checkpoint(checkpoint)
+    pending = [t for t in tables if (t["db_id"], t["table_name"]) not in done]
+    print(f"{len(tables)} tables, {len(tables) - len(pending)} already in {checkpoint}")
+
+    start = time.perf_counter()
+    run(pending, checkpoint, args.workers, args.batch_size, args.cache_db)
+    elapsed = time.perf_counter() - start
+    if pending:
+        print(f"Processed {len(pending)} tables in {elapsed:.1f}s ({len(pending) / elapsed:.2f} tables/s)")
+
+    done = load_checkpoint(checkpoint)
+    output = [done[(t["db_id"], t["table_name"])] for t in tables]
+    with open(args.output, "w") as f:
+        json.dump(output, f, indent=2)
+
+    print(f"Saved enriched metadata to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,66 +1,192 @@
+import argparse
 import json
+import os
+import sys
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from tqdm import tqdm
-from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from prompt_builder import assemble_prompt, count_tokens, render_question, render_schema_prefix, PROMPT_TOKEN_BUDGET
 
 SPIDER_QUESTIONS = "./raw_data/spider/train_spider.json"
 ENRICHED_TABLES = "./preprocessed_data/spider/spider_with_intents.json"
 OUTPUT_FILE = "./preprocessed_data/spider/finetune_codet5_spider1.jsonl"
+CHUNK_SIZE = 500
+READ_BLOCK_CHARS = 1 << 20
+# Slack for tokenizers that merge across the schema/question boundary.
+BUDGET_MARGIN_TOKENS = 2
 
-def load_json(path):
-    with open(path) as f:
-        return json.load(f)
-
-def build_prompt(example, db_schema, include_sql=True):
-    lines = []
-    lines.append(f"### Database: {example['db_id']}")
-    lines.append("")
-
-
-    for table in db_schema:
-        lines.append(f"### Table Schema: {table['table_name']} - {table['table_intent']}")
-        for col in table["columns"]:
-            col_name, col_type = col.split(" (", 1)
-            col_type = col_type.rstrip(")")
-            col_intent = table["column_intents"].get(col_name.lower(), "")
-            lines.append(f"- {col_name} ({col_type}): {col_intent}")
-        lines.append("")
-
-    lines.append(f"### Question: {example['question']}")
-    if include_sql:
-        lines.append("### SQL:")
+_schema_map = None
+_token_budget = None
+_prefixes = {}
 
-    return "\n".join(lines)
-
-def main():
-    questions = load_json(SPIDER_QUESTIONS)
-    enriched_tables = load_json(ENRICHED_TABLES)
 
+def iter_json_records(path, block_chars=READ_BLOCK_CHARS):
+    # Yields the records of a top-level JSON array (or a JSONL file) one at a
+    # time, holding at most one read block plus one record in memory.
+    decoder = json.JSONDecoder()
+    with open(path) as f:
+        buf = f.read(block_chars).lstrip()
+        if not buf.startswith("["):
+            f.seek(0)
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+        pos = 1
+        while True:
+            while pos < len(buf) and (buf[pos].isspace() or buf[pos] == ","):
+                pos += 1
+            if pos < len(buf) and buf[pos] == "]":
+                return
+            try:
+                if pos == len(buf):
+                    raise ValueError
+                record, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                more = f.read(block_chars)
+                if not more:
+                    raise ValueError(f"Unterminated JSON array in {path}")
+                buf, pos = buf[pos:] + more, 0
+                continue
+            yield record
+            pos = end
+
+
+def load_schema_map(path):
     db_schema_map = defaultdict(list)
-    for entry in enriched_tables:
+    for entry in iter_json_records(path):
         db_schema_map[entry["db_id"]].append(entry)
+    return dict(db_schema_map)
+
+
+def _init_worker(schema_map, token_budget):
+    global _schema_map, _token_budget
+    _schema_map = schema_map
+    _token_budget = token_budget
+
+
+def _schema_prefix(db_id):
+    # Spider schemas never change, so each db_id's schema block is rendered
+    # and counted once per worker.
+    if db_id not in _prefixes:
+        prefix = render_schema_prefix(db_id, _schema_map[db_id], schema_version=0)
+        _prefixes[db_id] = prefix, count_tokens(prefix)
+    return _prefixes[db_id]
+
+
+def build_example(ex):
+    db_id = ex["db_id"]
+    prefix, prefix_tokens = _schema_prefix(db_id)
+    question = render_question(ex["question"])
+    trimmed = False
+    if _token_budget and prefix_tokens + count_tokens(question, add_special_tokens=False) \
+            > _token_budget - BUDGET_MARGIN_TOKENS:
+        assembled = assemble_prompt(ex["question"], db_id, _schema_map[db_id], schema_version=0,
+                                    token_budget=_token_budget)
+        prompt = assembled["prompt"]
+        trimmed = bool(assembled["dropped_tables"] or assembled["dropped_columns"])
+    else:
+        prompt = prefix + question
+    row = {"db_id": db_id, "prompt": prompt, "completion": ex["query"]}
+    return json.dumps(row) + "\n", trimmed
+
+
+def build_chunk(examples):
+    lines, trimmed = [], 0
+    for ex in examples:
+        line, was_trimmed = build_example(ex)
+        lines.append(line)
+        trimmed += was_trimmed
+    return "".join(lines).encode("utf-8"), len(lines), trimmed
+
+
+def read_checkpoint(path):
+    if not os.path.exists(path):
+        return {"questions_done": 0, "rows_written": 0, "output_bytes": 0, "trimmed": 0}
+    with open(path) as f:
+        return json.load(f)
+
 
-    output_data = []
+def write_checkpoint(path, state):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
 
-    for ex in tqdm(questions):
-        db_id = ex["db_id"]
-        if db_id not in db_schema_map:
-            continue
 
-        schema_info = db_schema_map[db_id]
-        prompt = build_prompt(ex, schema_info)
-        completion = ex["query"]
+def iter_chunks(records, schema_map, chunk_size):
+    # Chunks carry the number of input records they consume so the checkpoint
+    # can skip questions whose db_id has no schema as well.
+    while True:
+        consumed = list(islice(records, chunk_size))
+        if not consumed:
+            return
+        examples = [
+            {"db_id": ex["db_id"], "question": ex["question"], "query": ex["query"]}
+            for ex in consumed if ex["db_id"] in schema_map
+        ]
+        yield examples, len(consumed)
 
-        output_data.append({
-            "db_id": db_id,
-            "prompt": prompt,
-            "completion": completion
-        })
 
-    with open(OUTPUT_FILE, "w") as f:
-        for row in output_data:
-            f.write(json.dumps(row) + "\n")
+def main():
+    parser = argparse.ArgumentParser(description="Build the prompt/completion fine-tuning set from Spider.")
+    parser.add_argument("--questions", default=SPIDER_QUESTIONS, help="JSON array or JSONL of Spider questions")
+    parser.add_argument("--tables", default=ENRICHED_TABLES)
+    parser.add_argument("--output", default=OUTPUT_FILE)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--token-budget", type=int, default=PROMPT_TOKEN_BUDGET, help="0 disables trimming")
+    parser.add_argument("--checkpoint", help="Defaults to <output>.checkpoint.json")
+    parser.add_argument("--restart", action="store_true", help="Ignore any checkpoint and start over")
+    args = parser.parse_args()
+
+    checkpoint = args.checkpoint or args.output + ".checkpoint.json"
+    if args.restart and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    state = read_checkpoint(checkpoint)
+    if state["questions_done"]:
+        print(f"Resuming after {state['questions_done']} questions ({state['rows_written']} rows written)")
+
+    schema_map = load_schema_map(args.tables)
+    records = iter_json_records(args.questions)
+    for _ in islice(records, state["questions_done"]):
+        pass
+
+    # Anything written after the last checkpoint is from an interrupted run.
+    with open(args.output, "ab") as f:
+        f.truncate(state["output_bytes"])
+
+    chunks = iter_chunks(records, schema_map, args.chunk_size)
+    max_pending = 2 * args.workers
+    with ProcessPoolExecutor(args.workers, initializer=_init_worker, initargs=(schema_map, args.token_budget)) as pool, \
+            open(args.output, "ab") as f, tqdm(initial=state["questions_done"], unit="q") as progress:
+        pending = deque()
+        while True:
+            # A bounded window of chunks in flight keeps memory flat; results
+            # are written in submission order so the output is deterministic.
+            for examples, consumed in islice(chunks, max_pending - len(pending)):
+                pending.append((pool.submit(build_chunk, examples), consumed))
+            if not pending:
+                break
+            future, consumed = pending.popleft()
+            data, rows, trimmed = future.result()
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+            state["questions_done"] += consumed
+            state["rows_written"] += rows
+            state["trimmed"] += trimmed
+            state["output_bytes"] = f.tell()
+            write_checkpoint(checkpoint, state)
+            progress.update(consumed)
+
+    print(f"\nSaved {state['rows_written']} training examples to: {args.output}")
+    print(f"{state['trimmed']} prompts were trimmed to the {args.token_budget}-token budget")
 
-    print(f"\nSaved training data to: {OUTPUT_FILE}")
 
 if __name__ == "__main__":
     main()
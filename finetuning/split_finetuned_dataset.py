@@ -1,41 +1,125 @@
+import argparse
+import hashlib
 import json
-import random
+import os
+from collections import Counter, defaultdict
 from pathlib import Path
 
 INPUT_FILE = "./preprocessed_data/spider/finetune_codet5_spider1.jsonl"
 OUTPUT_DIR = "./preprocessed_data/spider/finetune_splits"
-SPLIT_RATIO = (0.9, 0.05, 0.05) 
-SEED = 42
+SPLITS = ("train", "val", "test")
+SPLIT_RATIO = (0.9, 0.05, 0.05)
+SPLIT_KEY = "db_id"
+SALT = "42"
 
-def load_jsonl(path):
-    with open(path) as f:
-        return [json.loads(line) for line in f]
 
-def write_jsonl(path, data):
-    with open(path, "w") as f:
-        for row in data:
-            f.write(json.dumps(row) + "\n")
+def bucket_of(value, salt=SALT):
+    # Two independent uniform numbers from one sha256: the first picks the
+    # split, the second the shard. Same key, same split, on every machine.
+    digest = hashlib.sha256(f"{salt}:{value}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") / 2 ** 64, int.from_bytes(digest[8:16], "big")
+
+
+def assign_split(fraction, ratios):
+    cumulative = 0.0
+    for name, ratio in zip(SPLITS, ratios):
+        cumulative += ratio
+        if fraction < cumulative:
+            return name
+    return SPLITS[-1]
+
+
+def shard_path(output_dir, split, shard, shards):
+    if shards == 1:
+        return os.path.join(output_dir, f"{split}.jsonl")
+    return os.path.join(output_dir, f"{split}-{shard:05d}-of-{shards:05d}.jsonl")
 
-def main():
-    data = load_jsonl(INPUT_FILE)
-    random.seed(SEED)
-    random.shuffle(data)
 
-    n = len(data)
-    n_train = int(SPLIT_RATIO[0] * n)
-    n_val = int(SPLIT_RATIO[1] * n)
+def split_file(input_file, output_dir, ratios=SPLIT_RATIO, key=SPLIT_KEY, salt=SALT, shards=1):
+    # One pass over the input; only the open shard files and per-key counts are
+    # held in memory. With key=None every row is hashed on its own content.
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    files = {}
+    rows = Counter()
+    keys = defaultdict(set)
+    shard_rows = Counter()
+    try:
+        with open(input_file, "rb") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                value = json.loads(line)[key] if key else line.strip().decode("utf-8")
+                fraction, shard_hash = bucket_of(value, salt)
+                split = assign_split(fraction, ratios)
+                # Rows that share a key land in the same shard too.
+                shard = shard_hash % shards
+                path = shard_path(output_dir, split, shard, shards)
+                if path not in files:
+                    files[path] = open(path, "wb")
+                files[path].write(line if line.endswith(b"\n") else line + b"\n")
+                rows[split] += 1
+                shard_rows[path] += 1
+                if key:
+                    keys[split].add(value)
+    finally:
+        for handle in files.values():
+            handle.close()
+
+    # Splits or shards that received no rows still get an (empty) file.
+    for split in SPLITS:
+        for shard in range(shards):
+            path = shard_path(output_dir, split, shard, shards)
+            if path not in files:
+                open(path, "wb").close()
+
+    total = sum(rows.values())
+    return {
+        "input_file": input_file,
+        "key": key,
+        "salt": salt,
+        "ratios": dict(zip(SPLITS, ratios)),
+        "total_rows": total,
+        "splits": {
+            split: {
+                "rows": rows[split],
+                "fraction": rows[split] / total if total else 0.0,
+                "keys": len(keys[split]) if key else None,
+                "shards": {os.path.basename(shard_path(output_dir, split, shard, shards)):
+                           shard_rows[shard_path(output_dir, split, shard, shards)] for shard in range(shards)}
+            }
+            for split in SPLITS
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split the fine-tuning JSONL into train/val/test by a hashed key.")
+    parser.add_argument("--input", default=INPUT_FILE)
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--ratios", default=",".join(map(str, SPLIT_RATIO)), help="train,val,test fractions")
+    parser.add_argument("--key", default=SPLIT_KEY, help="Field to group rows by; 'none' hashes each row")
+    parser.add_argument("--salt", default=SALT, help="Change to draw a different, equally reproducible split")
+    parser.add_argument("--shards", type=int, default=1)
+    parser.add_argument("--stats", help="Defaults to <output-dir>/split_stats.json")
+    args = parser.parse_args()
 
-    train_data = data[:n_train]
-    val_data = data[n_train:n_train + n_val]
-    test_data = data[n_train + n_val:]
+    ratios = tuple(float(r) for r in args.ratios.split(","))
+    if len(ratios) != len(SPLITS) or abs(sum(ratios) - 1) > 1e-6:
+        parser.error("--ratios needs three fractions that sum to 1")
+    key = None if args.key.lower() == "none" else args.key
 
-    Path(OUTPUT_DIR).mkdir(parents=True, exist_ok=True)
+    stats = split_file(args.input, args.output_dir, ratios, key, args.salt, args.shards)
+    stats_path = args.stats or os.path.join(args.output_dir, "split_stats.json")
+    with open(stats_path, "w") as f:
+        json.dump(stats, f, indent=2)
 
-    write_jsonl(f"{OUTPUT_DIR}/train.jsonl", train_data)
-    write_jsonl(f"{OUTPUT_DIR}/val.jsonl", val_data)
-    write_jsonl(f"{OUTPUT_DIR}/test.jsonl", test_data)
+    counts = stats["splits"]
+    print(f"Train: {counts['train']['rows']}, Val: {counts['val']['rows']}, Test: {counts['test']['rows']}")
+    if key:
+        print(f"Distinct {key} values - Train: {counts['train']['keys']}, Val: {counts['val']['keys']}, "
+              f"Test: {counts['test']['keys']}")
+    print(f"Split statistics written to: {stats_path}")
 
-    print(f"Train: {len(train_data)}, Val: {len(val_data)}, Test: {len(test_data)}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,86 @@
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+MAX_BATCH_SIZE = int(os.getenv("MODEL_SERVER_MAX_BATCH_SIZE", "8"))
+MAX_WAIT_MS = float(os.getenv("MODEL_SERVER_MAX_WAIT_MS", "10"))
+
+
+class MicroBatcher:
+    # Collects single requests from many callers into batches for one worker
+    # thread. A batch is dispatched once it reaches max_batch_size or once the
+    # oldest request has waited max_wait_ms, whichever comes first.
+
+    def __init__(self, name, handler, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+        self.name = name
+        self.handler = handler
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._requests = 0
+        self._errors = 0
+        self._queue_wait_seconds = 0.0
+        self._batch_seconds = 0.0
+        self._thread = threading.Thread(target=self._loop, name=f"{name}-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            try:
+                results = self.handler([item for item, _, _ in batch])
+                error = None
+            except Exception as e:
+                results, error = [None] * len(batch), e
+            finished = time.perf_counter()
+
+            for (_, future, _), result in zip(batch, results):
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+            with self._lock:
+                self._batch_sizes[len(batch)] += 1
+                self._requests += len(batch)
+                self._errors += len(batch) if error is not None else 0
+                self._queue_wait_seconds += sum(started - enqueued for _, _, enqueued in batch)
+                self._batch_seconds += finished - started
+
+    def stats(self):
+        with self._lock:
+            batches = sum(self._batch_sizes.values())
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "requests": self._requests,
+                "errors": self._errors,
+                "batches": batches,
+                "avg_batch_size": self._requests / batches if batches else 0.0,
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+                "avg_queue_wait_ms": 1000 * self._queue_wait_seconds / self._requests if self._requests else 0.0,
+                "avg_batch_ms": 1000 * self._batch_seconds / batches if batches else 0.0
+            }
@@ -0,0 +1,26 @@
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from embeddings import EMBEDDING_MODEL_NAME
+from inference_backends import QUERY_MODEL_NAME, HF_TOKEN, export_sentence_encoder, export_seq2seq
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the encoder and SQL models for the ONNX Runtime backends.")
+    parser.add_argument("--backends", default="onnx,onnx-int8")
+    parser.add_argument("--models", default="encoder,sql", help="Comma-separated subset of: encoder, sql")
+    args = parser.parse_args()
+
+    models = args.models.split(",")
+    for backend in args.backends.split(","):
+        if "encoder" in models:
+            print(f"Exported {EMBEDDING_MODEL_NAME} ({backend}) to {export_sentence_encoder(EMBEDDING_MODEL_NAME, backend)}")
+        if "sql" in models:
+            print(f"Exported {QUERY_MODEL_NAME} ({backend}) to {export_seq2seq(QUERY_MODEL_NAME, backend, HF_TOKEN)}")
+
+
+if __name__ == "__main__":
+    main()
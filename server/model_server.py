@@ -0,0 +1,125 @@
+import argparse
+import asyncio
+import os
+import sys
+import threading
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from fastapi import FastAPI
+from pydantic import BaseModel
+
+from batcher import MicroBatcher, MAX_BATCH_SIZE, MAX_WAIT_MS
+from inference_backends import INFERENCE_BACKEND, QUERY_MODEL_NAME, HF_TOKEN, load_seq2seq
+from intent_infer import generate_intents_batch, get_intent_model
+from prompt_builder import PROMPT_TOKEN_BUDGET
+from stub_server import stub_generate_queries, stub_generate_intents
+
+QUERY_BACKEND = os.getenv("QUERY_BACKEND", INFERENCE_BACKEND)
+MAX_NEW_TOKENS = 200
+
+_query_model = None
+_query_model_lock = threading.Lock()
+
+
+class IntentRequest(BaseModel):
+    table_name: str
+    columns: List[str]
+    data_types: List[str]
+
+
+class IntentBatchRequest(BaseModel):
+    tables: List[IntentRequest]
+
+
+class QueryRequest(BaseModel):
+    prompt: str
+
+
+def get_query_model():
+    global _query_model
+    if _query_model is None:
+        with _query_model_lock:
+            if _query_model is None:
+                _query_model = load_seq2seq(QUERY_MODEL_NAME, QUERY_BACKEND, token=HF_TOKEN)
+    return _query_model
+
+
+def generate_queries(prompts):
+    import torch
+
+    tokenizer, model = get_query_model()
+    # Pads to the longest prompt in the batch, not to the token budget.
+    inputs = tokenizer(prompts, padding=True, truncation=True, max_length=PROMPT_TOKEN_BUDGET, return_tensors="pt")
+    with torch.inference_mode():
+        outputs = model.generate(**inputs, max_new_tokens=MAX_NEW_TOKENS, do_sample=False)
+    return [sql.strip() for sql in tokenizer.batch_decode(outputs, skip_special_tokens=True)]
+
+
+def generate_intents_for_batch(tables):
+    # The app keeps its own intent cache, so the server always generates.
+    return generate_intents_batch(tables, llm=get_intent_model(), batch_size=len(tables), cache_db=None)
+
+
+def create_app(query_handler=generate_queries, intent_handler=generate_intents_for_batch,
+               max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+    app = FastAPI()
+    query_batcher = MicroBatcher("query", query_handler, max_batch_size, max_wait_ms)
+    intent_batcher = MicroBatcher("intent", intent_handler, max_batch_size, max_wait_ms)
+
+    async def submit(batcher, item):
+        return await asyncio.wrap_future(batcher.submit(item))
+
+    @app.post("/generate_query")
+    async def generate_sql(req: QueryRequest):
+        return {"sql_query": await submit(query_batcher, req.prompt)}
+
+    @app.post("/generate_intents")
+    async def get_intents(req: IntentRequest):
+        table_intent, column_intents = await submit(intent_batcher, (req.table_name, req.columns, req.data_types))
+        return {
+            "table_intent": table_intent,
+            "column_intents": column_intents
+        }
+
+    @app.post("/generate_intents_batch")
+    async def get_intents_batch(req: IntentBatchRequest):
+        # Tables are queued one by one so they can share batches with other requests.
+        results = await asyncio.gather(*[
+            submit(intent_batcher, (t.table_name, t.columns, t.data_types)) for t in req.tables
+        ])
+        return {
+            "results": [
+                {"table_intent": table_intent, "column_intents": column_intents}
+                for table_intent, column_intents in results
+            ]
+        }
+
+    @app.get("/metrics")
+    def metrics():
+        return {"query": query_batcher.stats(), "intent": intent_batcher.stats()}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the SQL and intent models with dynamic micro-batching.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-batch-size", type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS)
+    parser.add_argument("--stub", action="store_true", help="Serve deterministic stub outputs instead of the models")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    if args.stub:
+        app = create_app(stub_generate_queries, stub_generate_intents, args.max_batch_size, args.max_wait_ms)
+    else:
+        app = create_app(max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms)
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
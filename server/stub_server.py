@@ -0,0 +1,130 @@
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from batcher import MicroBatcher, MAX_BATCH_SIZE, MAX_WAIT_MS
+
+# Deterministic stand-in for the models, with the same endpoints, payloads and
+# micro-batching as model_server.py but no fastapi. Intents are derived from
+# table and column names; generated SQL counts the rows of the first table in
+# the prompt.
+
+# Simulated model cost: a fixed per-batch overhead plus a per-item cost.
+STUB_BATCH_SECONDS = float(os.getenv("STUB_BATCH_SECONDS", "0.05"))
+STUB_ITEM_SECONDS = float(os.getenv("STUB_ITEM_SECONDS", "0.005"))
+
+_TABLE_RE = re.compile(r"^### Table Schema: (.+?) - ", re.M)
+
+
+def stub_sql(prompt):
+    match = _TABLE_RE.search(prompt)
+    if not match:
+        return "SELECT 1"
+    return 'SELECT COUNT(*) FROM "' + match.group(1).replace('"', '""') + '"'
+
+
+def stub_intents(table_name, columns):
+    words = table_name.replace("_", " ")
+    return (
+        f"Stores {words} records and their attributes.",
+        {col.lower(): f"The {col.replace('_', ' ')} of each {words} record." for col in columns}
+    )
+
+
+def stub_generate_queries(prompts, batch_seconds=STUB_BATCH_SECONDS, item_seconds=STUB_ITEM_SECONDS):
+    time.sleep(batch_seconds + item_seconds * len(prompts))
+    return [stub_sql(prompt) for prompt in prompts]
+
+
+def stub_generate_intents(tables, batch_seconds=STUB_BATCH_SECONDS, item_seconds=STUB_ITEM_SECONDS):
+    time.sleep(batch_seconds + item_seconds * len(tables))
+    return [stub_intents(table_name, columns) for table_name, columns, _ in tables]
+
+
+def _make_handler(query_batcher, intent_batcher):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, payload, status=200):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/metrics":
+                self._reply({"query": query_batcher.stats(), "intent": intent_batcher.stats()})
+            else:
+                self._reply({"detail": "Not Found"}, 404)
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if self.path == "/generate_query":
+                self._reply({"sql_query": query_batcher.submit(request["prompt"]).result()})
+            elif self.path == "/generate_intents":
+                table_intent, column_intents = intent_batcher.submit(
+                    (request["table_name"], request["columns"], request.get("data_types"))
+                ).result()
+                self._reply({"table_intent": table_intent, "column_intents": column_intents})
+            elif self.path == "/generate_intents_batch":
+                futures = [
+                    intent_batcher.submit((t["table_name"], t["columns"], t.get("data_types")))
+                    for t in request["tables"]
+                ]
+                self._reply({
+                    "results": [
+                        {"table_intent": table_intent, "column_intents": column_intents}
+                        for table_intent, column_intents in (future.result() for future in futures)
+                    ]
+                })
+            else:
+                self._reply({"detail": "Not Found"}, 404)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_stub_server(host="127.0.0.1", port=0, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS,
+                      batch_seconds=STUB_BATCH_SECONDS, item_seconds=STUB_ITEM_SECONDS):
+    # Serves in a background thread. Returns (server, base_url); call
+    # server.shutdown() when done.
+    query_batcher = MicroBatcher(
+        "query", partial(stub_generate_queries, batch_seconds=batch_seconds, item_seconds=item_seconds),
+        max_batch_size, max_wait_ms
+    )
+    intent_batcher = MicroBatcher(
+        "intent", partial(stub_generate_intents, batch_seconds=batch_seconds, item_seconds=item_seconds),
+        max_batch_size, max_wait_ms
+    )
+    server = ThreadingHTTPServer((host, port), _make_handler(query_batcher, intent_batcher))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve deterministic stub model outputs with micro-batching.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-batch-size", type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS)
+    args = parser.parse_args()
+
+    server, url = start_stub_server(args.host, args.port, args.max_batch_size, args.max_wait_ms)
+    print(f"Stub model server on {url}", file=sys.stderr, flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()